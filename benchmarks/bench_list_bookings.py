@@ -0,0 +1,105 @@
+# bench_list_bookings.py
+# 予約一覧の大きなページについて、従来の経路（ORM → Pydantic の検証 → json）と
+# 高速な経路（Core の行 → orjson）の1ページあたりの処理時間を比べる
+#
+#   python benchmarks/bench_list_bookings.py --rows 20000 --limits 100 1000 5000
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "fastapi"))
+
+import orjson  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+
+import crud_async  # noqa: E402
+import models  # noqa: E402
+import schemas  # noqa: E402
+
+booking_list = TypeAdapter(list[schemas.Booking])
+
+
+# FastAPI が response_model=list[schemas.Booking] のルートで行う処理と同じ
+async def old_path(db, limit):
+    bookings = await crud_async.get_booking(db, limit=limit)
+    content = booking_list.dump_python(
+        booking_list.validate_python(bookings, from_attributes=True), mode="json"
+    )
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode()
+
+
+# fast_json.list_response と同じ
+async def new_path(db, limit):
+    rows = await crud_async.get_booking_rows(db, limit=limit)
+    return orjson.dumps(rows)
+
+
+async def measure(session_factory, path, limit, repeat):
+    timings = []
+    for _ in range(repeat):
+        # 毎回新しいセッションを使う（リクエストごとのセッションと同じ条件）
+        async with session_factory() as db:
+            started = time.perf_counter()
+            body = await path(db, limit)
+            timings.append(time.perf_counter() - started)
+    return min(timings), len(body)
+
+
+async def run(rows: int, limits: list, repeat: int):
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_async_engine(
+            f"sqlite+aiosqlite:///{os.path.join(directory, 'bench.sqlite')}"
+        )
+        async with engine.begin() as conn:
+            await conn.run_sync(models.Base.metadata.create_all)
+            base = datetime(2024, 1, 1)
+            await conn.execute(
+                insert(models.Booking),
+                [
+                    {
+                        "user_id": i % 50,
+                        "room_id": i % 20,
+                        "start_datetime": base + timedelta(minutes=30 * i),
+                        "end_datetime": base + timedelta(minutes=30 * i + 30),
+                    }
+                    for i in range(rows)
+                ],
+            )
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        print(f"rows={rows} repeat={repeat} (best of)")
+        for limit in limits:
+            old_seconds, old_size = await measure(
+                session_factory, old_path, limit, repeat
+            )
+            new_seconds, new_size = await measure(
+                session_factory, new_path, limit, repeat
+            )
+            print(
+                f"limit={limit:6d}  old_ms={old_seconds * 1000:8.1f}  "
+                f"new_ms={new_seconds * 1000:8.1f}  "
+                f"speedup={old_seconds / new_seconds:5.1f}x  "
+                f"bytes={old_size}/{new_size}"
+            )
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--limits", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(run(args.rows, args.limits, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# bench_login.py
+# ログイン時の bcrypt 検証のスループットがワーカー数（コア数）に応じて伸びることを確認する
+#
+#   python benchmarks/bench_login.py --logins 64
+import argparse
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "fastapi"))
+
+from security import hash_password, verify_password_async  # noqa: E402
+
+
+# イベントループの遅延（他のリクエストがどれだけ待たされるか）を測る
+async def measure_loop_lag(stop: asyncio.Event, interval: float = 0.01):
+    max_lag = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        max_lag = max(max_lag, time.perf_counter() - started - interval)
+    return max_lag
+
+
+async def run(workers: int, logins: int, hashed: str):
+    executor = ThreadPoolExecutor(max_workers=workers)
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_loop_lag(stop))
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(verify_password_async("password", hashed, executor) for _ in range(logins))
+    )
+    elapsed = time.perf_counter() - started
+    stop.set()
+    max_lag = await lag_task
+    executor.shutdown()
+    return logins / elapsed, max_lag
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=32)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    hashed = hash_password("password")
+    workers = 1
+    print(f"cpu_count={os.cpu_count()} logins={args.logins}")
+    while workers <= args.max_workers:
+        throughput, max_lag = asyncio.run(run(workers, args.logins, hashed))
+        print(
+            f"workers={workers:3d}  logins/s={throughput:8.1f}  "
+            f"max_event_loop_lag_ms={max_lag * 1000:6.1f}"
+        )
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+# alembic/env.py
+from logging.config import fileConfig
+
+from alembic import context
+from database import engine
+from models import Base
+
+config = context.config
+
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+# マイグレーション対象のメタデータ
+target_metadata = Base.metadata
+
+
+# オフラインモード（SQLを出力するだけ）
+def run_migrations_offline():
+    context.configure(
+        url=str(engine.url),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+# オンラインモード（database.py のエンジンで実行する）
+def run_migrations_online():
+    with engine.connect() as connection:
+        context.configure(connection=connection, target_metadata=target_metadata)
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,25 @@
+"""bookings に (room_id, start_datetime, end_datetime) の複合インデックスを追加
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        "ix_bookings_room_id_start_end",
+        "bookings",
+        ["room_id", "start_datetime", "end_datetime"],
+    )
+
+
+def downgrade():
+    op.drop_index("ix_bookings_room_id_start_end", table_name="bookings")
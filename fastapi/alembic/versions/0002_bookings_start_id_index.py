@@ -0,0 +1,23 @@
+"""bookings に (start_datetime, booking_id) のインデックスを追加
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        "ix_bookings_start_id", "bookings", ["start_datetime", "booking_id"]
+    )
+
+
+def downgrade():
+    op.drop_index("ix_bookings_start_id", table_name="bookings")
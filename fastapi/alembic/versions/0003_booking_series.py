@@ -0,0 +1,53 @@
+"""定期予約（booking_series）テーブルと bookings.series_id を追加
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "booking_series",
+        sa.Column("series_id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("user_id", sa.Integer(), nullable=True),
+        sa.Column(
+            "room_id",
+            sa.Integer(),
+            sa.ForeignKey("rooms.room_id", ondelete="SET NULL"),
+            nullable=True,
+        ),
+        sa.Column("freq", sa.String(10), nullable=False),
+        sa.Column("interval", sa.Integer(), nullable=False),
+        sa.Column("count", sa.Integer(), nullable=True),
+        sa.Column("until", sa.DateTime(), nullable=True),
+        sa.Column("start_datetime", sa.DateTime(), nullable=False),
+        sa.Column("end_datetime", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_booking_series_series_id", "booking_series", ["series_id"])
+    op.create_index("ix_booking_series_user_id", "booking_series", ["user_id"])
+    op.add_column("bookings", sa.Column("series_id", sa.Integer(), nullable=True))
+    op.create_index("ix_bookings_series_id", "bookings", ["series_id"])
+    op.create_foreign_key(
+        "fk_bookings_series_id",
+        "bookings",
+        "booking_series",
+        ["series_id"],
+        ["series_id"],
+        ondelete="SET NULL",
+    )
+
+
+def downgrade():
+    op.drop_constraint("fk_bookings_series_id", "bookings", type_="foreignkey")
+    op.drop_index("ix_bookings_series_id", table_name="bookings")
+    op.drop_column("bookings", "series_id")
+    op.drop_table("booking_series")
@@ -0,0 +1,27 @@
+"""bookings の user_id 単独インデックスを (user_id, start_datetime) の複合インデックスに置き換え
+
+会議室での絞り込みは 0001 の (room_id, start_datetime, end_datetime) を先頭一致で使う。
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        "ix_bookings_user_id_start", "bookings", ["user_id", "start_datetime"]
+    )
+    op.drop_index("ix_bookings_user_id", table_name="bookings")
+
+
+def downgrade():
+    op.create_index("ix_bookings_user_id", "bookings", ["user_id"])
+    op.drop_index("ix_bookings_user_id_start", table_name="bookings")
@@ -0,0 +1,42 @@
+"""作成系APIの Idempotency-Key を保持する idempotency_keys テーブルを追加
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "idempotency_keys",
+        sa.Column(
+            "idempotency_key_id", sa.Integer(), primary_key=True, autoincrement=True
+        ),
+        sa.Column("endpoint", sa.String(100), nullable=False),
+        sa.Column("key", sa.String(255), nullable=False),
+        sa.Column("request_hash", sa.String(64), nullable=False),
+        sa.Column("status_code", sa.Integer(), nullable=True),
+        sa.Column("response_body", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index(
+        "ux_idempotency_keys_endpoint_key",
+        "idempotency_keys",
+        ["endpoint", "key"],
+        unique=True,
+    )
+    op.create_index(
+        "ix_idempotency_keys_created_at", "idempotency_keys", ["created_at"]
+    )
+
+
+def downgrade():
+    op.drop_table("idempotency_keys")
@@ -0,0 +1,32 @@
+"""bookings の (start_datetime, booking_id) のインデックスに end_datetime と room_id を追加
+
+期間で絞り込む稼働率の集計を、表を読まずにインデックスだけで行えるようにする。
+キーセットページングは引き続き先頭一致で使う。
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        "ix_bookings_start_id_end_room",
+        "bookings",
+        ["start_datetime", "booking_id", "end_datetime", "room_id"],
+    )
+    op.drop_index("ix_bookings_start_id", table_name="bookings")
+
+
+def downgrade():
+    op.create_index(
+        "ix_bookings_start_id", "bookings", ["start_datetime", "booking_id"]
+    )
+    op.drop_index("ix_bookings_start_id_end_room", table_name="bookings")
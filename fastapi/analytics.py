@@ -0,0 +1,270 @@
+# analytics.py
+# 稼働率集計用の SQL 関数（MySQL と SQLite の両方で動くように方言ごとに出し分ける）
+# と、日・時間帯ごとの集計
+from collections import OrderedDict, namedtuple
+from datetime import timedelta
+
+import numpy as np
+from sqlalchemy import DateTime, Float, Integer
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+
+
+# 2つの日時の差（秒）
+class seconds_between(FunctionElement):
+    type = Float()
+    inherit_cache = True
+
+
+@compiles(seconds_between)
+def _seconds_between_default(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return "TIMESTAMPDIFF(SECOND, %s, %s)" % (
+        compiler.process(start, **kw),
+        compiler.process(end, **kw),
+    )
+
+
+@compiles(seconds_between, "sqlite")
+def _seconds_between_sqlite(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return "((julianday(%s) - julianday(%s)) * 86400.0)" % (
+        compiler.process(end, **kw),
+        compiler.process(start, **kw),
+    )
+
+
+# 2つの値の大きい方 / 小さい方
+class greatest(FunctionElement):
+    type = DateTime()
+    inherit_cache = True
+
+
+class least(FunctionElement):
+    type = DateTime()
+    inherit_cache = True
+
+
+@compiles(greatest)
+def _greatest_default(element, compiler, **kw):
+    return "GREATEST(%s)" % compiler.process(element.clauses, **kw)
+
+
+@compiles(greatest, "sqlite")
+def _greatest_sqlite(element, compiler, **kw):
+    return "MAX(%s)" % compiler.process(element.clauses, **kw)
+
+
+@compiles(least)
+def _least_default(element, compiler, **kw):
+    return "LEAST(%s)" % compiler.process(element.clauses, **kw)
+
+
+@compiles(least, "sqlite")
+def _least_sqlite(element, compiler, **kw):
+    return "MIN(%s)" % compiler.process(element.clauses, **kw)
+
+
+# 2つの日時の差（整数の秒、バケットの境界を丸め誤差なく求めるため）
+class whole_seconds_between(FunctionElement):
+    type = Integer()
+    inherit_cache = True
+
+
+@compiles(whole_seconds_between)
+def _whole_seconds_between_default(element, compiler, **kw):
+    return _seconds_between_default(element, compiler, **kw)
+
+
+@compiles(whole_seconds_between, "sqlite")
+def _whole_seconds_between_sqlite(element, compiler, **kw):
+    return "CAST(ROUND(%s) AS INTEGER)" % _seconds_between_sqlite(
+        element, compiler, **kw
+    )
+
+
+# 集計の単位ごとのバケット（日 / 時間）と、結果の行のキー
+BUCKETS = {"room": "hour", "day": "day", "hour": "hour", "room_hour": "hour"}
+BUCKET_SECONDS = {"day": 86400, "hour": 3600}
+BUCKET_KEYS = {
+    "room": ["room_id"],
+    "day": ["day"],
+    "hour": ["hour"],
+    "room_hour": ["room_id", "hour"],
+}
+
+
+# バケット単位の集計行（get_utilization_buckets の結果）を、group_by ごとの行に展開する
+# 各行は room_id、first（開始バケット。時間の場合は 0〜23 の時刻）、span（終了バケットとの差）、
+# booking_count、head_seconds（開始バケット内の開始位置の合計）、
+# tail_seconds（終了バケット内の終了位置の合計）を持つ。
+# 予約は掛かっているバケットごとに分けて数え（9:00〜12:00 の予約は 9 時・10 時・11 時に
+# 3600 秒ずつ）、日・時間帯の booking_count はそのバケットに掛かっている予約の数とする。
+# 掛かっている全バケットに満了の秒数を加え（差分の累積和）、開始・終了バケットの端数を引く。
+def spread_utilization_rows(rows, group_by: str, first_day):
+    row_type = namedtuple(
+        "UtilizationRow", [*BUCKET_KEYS[group_by], "booked_seconds", "booking_count"]
+    )
+    if not rows:
+        return []
+    bucket_seconds = BUCKET_SECONDS[BUCKETS[group_by]]
+    by_room = BUCKET_KEYS[group_by][0] == "room_id"
+    room_ids, first, span, count, head, tail = np.array(
+        [
+            (
+                row.room_id if by_room else 0,
+                row.first,
+                row.span,
+                row.booking_count,
+                row.head_seconds,
+                row.tail_seconds,
+            )
+            for row in rows
+        ],
+        dtype=np.int64,
+    ).T
+    full = count * bucket_seconds
+    booked = full * (span + 1) - head - (full - tail)
+
+    if group_by == "room":
+        keys, owners = np.unique(room_ids, return_inverse=True)
+        return [
+            row_type(int(room_id), float(seconds), int(total))
+            for room_id, seconds, total in zip(
+                keys,
+                np.bincount(owners, weights=booked),
+                np.bincount(owners, weights=count),
+            )
+        ]
+
+    if by_room:
+        keys, owners = np.unique(room_ids, return_inverse=True)
+    else:
+        keys, owners = np.zeros(1, dtype=np.int64), np.zeros(len(rows), dtype=np.intp)
+    if group_by == "day":
+        width = int((first + span).max()) + 2
+        rounds, length = np.zeros_like(span), span + 1
+    else:
+        # 時刻ごとの集計は、24 時間を超える分を全時刻への一律の加算にする
+        width = 48
+        rounds, length = np.divmod(span + 1, 24)
+
+    seconds = np.zeros((len(keys), width))
+    counts = np.zeros((len(keys), width))
+    for grid, values in ((seconds, full), (counts, count)):
+        np.add.at(grid, (owners, first), values)
+        np.add.at(grid, (owners, first + length), -values)
+    seconds = np.cumsum(seconds, axis=1)
+    counts = np.cumsum(counts, axis=1)
+    last = first + span
+    if group_by != "day":
+        seconds = seconds[:, :24] + seconds[:, 24:]
+        counts = counts[:, :24] + counts[:, 24:]
+        seconds += np.bincount(owners, weights=rounds * full, minlength=len(keys))[
+            :, None
+        ]
+        counts += np.bincount(owners, weights=rounds * count, minlength=len(keys))[
+            :, None
+        ]
+        last %= 24
+    np.add.at(seconds, (owners, first), -head)
+    np.add.at(seconds, (owners, last), tail - full)
+
+    def key_values(key, bucket):
+        if group_by == "day":
+            return (first_day + timedelta(days=bucket),)
+        if group_by == "hour":
+            return (bucket,)
+        return (int(key), bucket)
+
+    owners, buckets = np.nonzero(counts)
+    return [
+        row_type(
+            *key_values(keys[owner], int(bucket)),
+            float(seconds[owner, bucket]),
+            int(counts[owner, bucket]),
+        )
+        for owner, bucket in zip(owners, buckets)
+    ]
+
+
+# 集計結果の行を、稼働時間・稼働率を含むグループのリストに整形する
+# 稼働率の分母は、そのグループで予約可能な時間（会議室数 × 時間）とする
+def build_utilization_groups(group_by, rows, rooms, days, peak_rows=()):
+    def to_group(key, booked_seconds, booking_count, capacity_seconds, **extra):
+        booked_seconds = float(booked_seconds or 0)
+        return {
+            "key": key,
+            "booked_hours": round(booked_seconds / 3600, 2),
+            "booking_count": booking_count,
+            "utilization_percent": round(booked_seconds / capacity_seconds * 100, 2)
+            if capacity_seconds
+            else 0.0,
+            **extra,
+        }
+
+    if group_by == "room":
+        rows_by_room = {row.room_id: row for row in rows}
+        # 会議室ごとに予約時間が最も長い時間帯をピークとする（同じ場合は早い時間帯）
+        peak_hours = {}
+        for row in sorted(peak_rows, key=lambda row: (row.booked_seconds, -row.hour)):
+            peak_hours[row.room_id] = row.hour
+        groups = []
+        for room in rooms:
+            row = rows_by_room.get(room.room_id)
+            groups.append(
+                to_group(
+                    str(room.room_id),
+                    row.booked_seconds if row else 0,
+                    row.booking_count if row else 0,
+                    days * 86400,
+                    room_id=room.room_id,
+                    room_name=room.room_name,
+                    peak_hour=peak_hours.get(room.room_id),
+                )
+            )
+        return groups
+
+    if group_by == "day":
+        return [
+            to_group(
+                str(row.day), row.booked_seconds, row.booking_count, len(rooms) * 86400
+            )
+            for row in sorted(rows, key=lambda row: str(row.day))
+        ]
+
+    rows_by_hour = {row.hour: row for row in rows}
+    return [
+        to_group(
+            f"{hour:02d}",
+            rows_by_hour[hour].booked_seconds if hour in rows_by_hour else 0,
+            rows_by_hour[hour].booking_count if hour in rows_by_hour else 0,
+            len(rooms) * days * 3600,
+        )
+        for hour in range(24)
+    ]
+
+
+# 終了済みの期間の集計結果のキャッシュ（キーに会議室・予約の版数を含めて使う）
+class ClosedPeriodCache:
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+utilization_cache = ClosedPeriodCache()
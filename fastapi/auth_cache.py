@@ -0,0 +1,77 @@
+# auth_cache.py
+import threading
+import time
+from collections import OrderedDict
+
+from settings import settings
+
+
+# 検証済みの JWT とユーザー情報を保持する TTL 付き LRU キャッシュ
+class TokenCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # token -> (user, expires_at)
+        self._tokens_by_user = {}  # user_id -> {token, ...}
+        self._lock = threading.Lock()
+
+    # キャッシュからユーザーを取得する（期限切れ・未登録の場合は None）
+    def get(self, token: str):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+            user, expires_at = entry
+            if expires_at <= time.time():
+                self._remove(token)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return user
+
+    # 検証済みのトークンを登録する（トークンの有効期限を超えては保持しない）
+    def put(self, token: str, user, token_expires_at: float):
+        expires_at = min(time.time() + self.ttl, token_expires_at)
+        with self._lock:
+            if token in self._entries:
+                self._remove(token)
+            self._entries[token] = (user, expires_at)
+            self._tokens_by_user.setdefault(user.user_id, set()).add(token)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+
+    # ユーザーの更新・削除時に、そのユーザーのトークンをすべて無効にする
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            for token in list(self._tokens_by_user.get(user_id, ())):
+                self._remove(token)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_user.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def _remove(self, token: str):
+        user, _ = self._entries.pop(token)
+        tokens = self._tokens_by_user.get(user.user_id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[user.user_id]
+
+
+token_cache = TokenCache(settings.auth_cache_size, settings.auth_cache_ttl)
@@ -0,0 +1,123 @@
+# broadcast.py
+import asyncio
+import itertools
+import json
+from collections import deque
+from datetime import datetime
+
+import schemas
+
+# 再接続時（Last-Event-ID）に再送するため保持する直近のイベント数
+REPLAY_SIZE = 1000
+# 購読者ごとに溜められる未送信イベント数（超えた購読者は切断し、再接続で再送させる）
+# 再接続時の再送分はこの上限に含めない
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+# 予約の変更イベントを受け取る購読者
+# room_id と [window_start, window_end) の期間で受け取るイベントを絞り込む
+class Subscription:
+    def __init__(self, room_id=None, window_start=None, window_end=None):
+        self.room_id = room_id
+        self.window_start = window_start
+        self.window_end = window_end
+        self.replay = []  # 購読開始時に再送するイベント（queue より先に送る）
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    # 予約の現在または変更前の内容が条件に当てはまるか
+    def wants(self, event) -> bool:
+        return any(
+            self._matches(snapshot)
+            for snapshot in (event["booking"], event.get("previous"))
+            if snapshot is not None
+        )
+
+    def _matches(self, snapshot) -> bool:
+        if self.room_id is not None and snapshot["room_id"] != self.room_id:
+            return False
+        if self.window_start is not None and (
+            snapshot["end_datetime"] <= self.window_start
+            or snapshot["start_datetime"] >= self.window_end
+        ):
+            return False
+        return True
+
+    # 送り切れない購読者は切断する（None を受け取るとストリームを終了する）
+    def close(self):
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+# 予約の変更を購読者に配るプロセス内のブロードキャスター
+# 待機中の購読者はキューを1つ持つだけなので、多数の常時接続でもほとんど負荷がかからない
+class BookingBroadcaster:
+    def __init__(self):
+        self._subscribers = set()
+        self._recent = deque(maxlen=REPLAY_SIZE)
+        self._ids = itertools.count(1)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    # 購読を開始する（last_event_id より後のイベントが残っていれば replay に入れる）
+    # replay はキューの上限を超えても切り捨てず、以降のイベントだけをキューで受け取る
+    def subscribe(self, subscription: Subscription, last_event_id: int = None):
+        if last_event_id is not None:
+            subscription.replay = [
+                event
+                for event in self._recent
+                if event["id"] > last_event_id and subscription.wants(event)
+            ]
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscribers.discard(subscription)
+
+    # 予約の変更を配る（commit 後にイベントループ上で呼び出す）
+    # event_type: created / updated / deleted、previous は更新前の内容
+    def publish(self, event_type: str, booking, previous: dict = None):
+        event = {
+            "id": next(self._ids),
+            "type": event_type,
+            "booking": booking_snapshot(booking),
+            "previous": previous,
+        }
+        self._recent.append(event)
+        for subscription in list(self._subscribers):
+            if subscription.wants(event):
+                self._deliver(subscription, event)
+
+    def _deliver(self, subscription: Subscription, event):
+        try:
+            subscription.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.unsubscribe(subscription)
+            subscription.close()
+
+
+# 予約の内容を dict にする（ORM のオブジェクトを commit 後も参照しないよう値を写す）
+def booking_snapshot(booking) -> dict:
+    return schemas.Booking.model_validate(booking, from_attributes=True).model_dump()
+
+
+# イベントを SSE の1メッセージにする
+def format_sse(event) -> str:
+    data = {
+        "type": event["type"],
+        "booking": event["booking"],
+        "previous": event["previous"],
+    }
+    payload = json.dumps(data, default=_isoformat, ensure_ascii=False)
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {payload}\n\n"
+
+
+def _isoformat(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+booking_broadcaster = BookingBroadcaster()
@@ -4,12 +4,41 @@ import models, schemas
 from models import Booking, GuestUser, User
 from security import verify_password, hash_password
 from typing import List
+from datetime import datetime, timedelta
+from bisect import bisect_left
+from itertools import groupby
+from contextlib import contextmanager
 from fastapi import HTTPException
+from sqlalchemy import and_, insert, or_, select, update
+from sqlalchemy.orm.exc import StaleDataError
+from pagination import decode_cursor
+from auth_cache import token_cache
+from room_cache import room_catalog
+from etag import data_versions
 
 
 # 既存のユーザー一覧を取得する関数
-def get_users(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(User).offset(skip).limit(limit).all()
+# cursor を指定した場合は主キーによるキーセットページングを行う
+def get_users(db: Session, skip: int = 0, limit: int = 100, cursor: str = None):
+    query = db.query(User).order_by(User.user_id)
+    if cursor is not None:
+        (last_user_id,) = decode_cursor(cursor, int)
+        query = query.filter(User.user_id > last_user_id)
+    else:
+        query = query.offset(skip)
+    return query.limit(limit).all()
+
+
+# ユーザー一覧を Core の行（dict）で取得する（パスワードハッシュは含めない）
+def get_user_rows(db: Session, skip: int = 0, limit: int = 100, cursor: str = None):
+    stmt = select(User.username, User.role, User.employee_number, User.user_id)
+    stmt = stmt.order_by(User.user_id)
+    if cursor is not None:
+        (last_user_id,) = decode_cursor(cursor, int)
+        stmt = stmt.where(User.user_id > last_user_id)
+    else:
+        stmt = stmt.offset(skip)
+    return [row._asdict() for row in db.connection().execute(stmt.limit(limit))]
 
 
 # ユーザー認証を行う関数
@@ -28,9 +57,15 @@ def get_user(db: Session, user_id: int):
     return db.query(User).filter(User.user_id == user_id).first()
 
 
-# 会議室一覧を取得する
-def get_rooms(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Room).offset(skip).limit(limit).all()
+# 会議室一覧を取得する（会議室キャッシュから返す）
+def get_rooms(db: Session, skip: int = 0, limit: int = 100, cursor: str = None):
+    rooms = room_catalog.rooms(db)
+    if cursor is not None:
+        (last_room_id,) = decode_cursor(cursor, int)
+        rooms = [room for room in rooms if room.room_id > last_room_id]
+    else:
+        rooms = rooms[skip:]
+    return rooms[:limit]
 
 
 # 特定の予約をIDで取得する
@@ -40,9 +75,158 @@ def get_booking_by_id(db: Session, booking_id: int):
     )
 
 
+# 指定した時間帯に空いている会議室を取得する
+# 重なる予約が存在しない会議室を NOT EXISTS の反結合1クエリで求める
+def get_available_rooms(
+    db: Session, start_datetime, end_datetime, min_capacity=None, executive=None
+):
+    conflict = (
+        db.query(models.Booking.booking_id)
+        .filter(
+            models.Booking.room_id == models.Room.room_id,
+            models.Booking.start_datetime < end_datetime,
+            models.Booking.end_datetime > start_datetime,
+        )
+        .exists()
+    )
+    query = db.query(models.Room).filter(~conflict)
+    if min_capacity is not None:
+        query = query.filter(models.Room.capacity >= min_capacity)
+    if executive is not None:
+        query = query.filter(models.Room.executive == executive)
+    return query.order_by(models.Room.room_id).all()
+
+
+# 条件に合う会議室を取得する（空き状況は問わない）
+def get_rooms_by_condition(db: Session, min_capacity=None, executive=None):
+    query = db.query(models.Room)
+    if min_capacity is not None:
+        query = query.filter(models.Room.capacity >= min_capacity)
+    if executive is not None:
+        query = query.filter(models.Room.executive == executive)
+    return query.order_by(models.Room.room_id).all()
+
+
+# 会議室ごとに start 以降の空き時間帯を最大 count 件求める
+# 期間内の予約を (room_id, start_datetime) 順に1クエリで読み込み、部屋ごとに走査する
+def get_free_slots(db: Session, room_ids, start_datetime, duration, count, horizon_end):
+    rows = (
+        db.query(
+            models.Booking.room_id,
+            models.Booking.start_datetime,
+            models.Booking.end_datetime,
+        )
+        .filter(
+            models.Booking.room_id.in_(room_ids),
+            models.Booking.start_datetime < horizon_end,
+            models.Booking.end_datetime > start_datetime,
+        )
+        .order_by(models.Booking.room_id, models.Booking.start_datetime)
+        .all()
+    )
+    return sweep_free_slots(
+        rows, room_ids, start_datetime, duration, count, horizon_end
+    )
+
+
+# (room_id, start_datetime) 順に並んだ予約行から部屋ごとの空き時間帯を求める
+def sweep_free_slots(rows, room_ids, start_datetime, duration, count, horizon_end):
+    bookings_by_room = {
+        room_id: [(row.start_datetime, row.end_datetime) for row in group]
+        for room_id, group in groupby(rows, key=lambda row: row.room_id)
+    }
+
+    free_slots = {}
+    for room_id in room_ids:
+        slots = []
+        cursor = start_datetime
+        for booked_start, booked_end in bookings_by_room.get(room_id, []):
+            if len(slots) >= count:
+                break
+            if booked_start - cursor >= duration:
+                slots.append((cursor, booked_start))
+            cursor = max(cursor, booked_end)
+        if len(slots) < count and horizon_end - cursor >= duration:
+            slots.append((cursor, horizon_end))
+        free_slots[room_id] = slots
+    return free_slots
+
+
 # 予約一覧を取得する
-def get_booking(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Booking).offset(skip).limit(limit).all()
+# (start_datetime, booking_id) の順に並べ、cursor 指定時はその続きから取得する
+def get_booking(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: str = None,
+    descending: bool = False,
+    **filters,
+):
+    query = (
+        db.query(models.Booking)
+        .filter(*booking_filters(**filters))
+        .order_by(*booking_order(descending))
+    )
+    if cursor is not None:
+        query = query.filter(booking_cursor_filter(cursor, descending))
+    else:
+        query = query.offset(skip)
+    return query.limit(limit).all()
+
+
+# 予約一覧の絞り込み条件を作る（開始日時は start_from 以上 start_to 未満）
+# 会議室・ユーザーの指定は (room_id, start_datetime) / (user_id, start_datetime)
+# のインデックスで範囲検索になる
+def booking_filters(
+    room_id: int = None,
+    user_id: int = None,
+    start_from: datetime = None,
+    start_to: datetime = None,
+    executive_only: bool = False,
+):
+    conditions = []
+    if room_id is not None:
+        conditions.append(models.Booking.room_id == room_id)
+    if user_id is not None:
+        conditions.append(models.Booking.user_id == user_id)
+    if start_from is not None:
+        conditions.append(models.Booking.start_datetime >= start_from)
+    if start_to is not None:
+        conditions.append(models.Booking.start_datetime < start_to)
+    if executive_only:
+        conditions.append(
+            models.Booking.room_id.in_(
+                select(models.Room.room_id).where(models.Room.executive.is_(True))
+            )
+        )
+    return conditions
+
+
+# 予約一覧の並び順（開始日時 → 予約ID、descending で新しい順）
+def booking_order(descending: bool = False):
+    if descending:
+        return models.Booking.start_datetime.desc(), models.Booking.booking_id.desc()
+    return models.Booking.start_datetime, models.Booking.booking_id
+
+
+# 予約一覧のカーソルから「その続き」を表す条件式を作る
+def booking_cursor_filter(cursor: str, descending: bool = False):
+    last_start, last_booking_id = decode_cursor(cursor, datetime, int)
+    if descending:
+        return or_(
+            models.Booking.start_datetime < last_start,
+            and_(
+                models.Booking.start_datetime == last_start,
+                models.Booking.booking_id < last_booking_id,
+            ),
+        )
+    return or_(
+        models.Booking.start_datetime > last_start,
+        and_(
+            models.Booking.start_datetime == last_start,
+            models.Booking.booking_id > last_booking_id,
+        ),
+    )
 
 
 # ユーザーを登録する
@@ -56,6 +240,7 @@ def create_user(db: Session, user: schemas.UserCreate):
     )
     db.add(db_user)
     db.commit()
+    data_versions.bump("users")
     db.refresh(db_user)
     return db_user
 
@@ -70,37 +255,176 @@ def create_room(db: Session, room: schemas.RoomCreate):
     )
     db.add(db_room)
     db.commit()
+    data_versions.bump("rooms")
     db.refresh(db_room)
+    room_catalog.invalidate()
     return db_room
 
 
-# 予約を登録する
-def create_booking(db: Session, booking: schemas.BookingCreate):
-    # 対象の部屋が役員専用かどうかを確認
-    room = db.query(models.Room).filter(models.Room.room_id == booking.room_id).first()
-    if room and room.executive:
-        # 役員専用の部屋の場合、ユーザーが役員かどうかをチェック
-        user = (
-            db.query(models.User).filter(models.User.user_id == booking.user_id).first()
+# 指定した時間帯に重なる予約を1件取得する（半開区間 [start, end) で判定）
+# (room_id, start_datetime, end_datetime) の複合インデックスを使う1クエリで完結させる
+def find_overlapping_booking(
+    db: Session, room_id: int, start_datetime, end_datetime, exclude_booking_id=None
+):
+    query = db.query(models.Booking.booking_id).filter(
+        models.Booking.room_id == room_id,
+        models.Booking.start_datetime < end_datetime,
+        models.Booking.end_datetime > start_datetime,
+    )
+    if exclude_booking_id is not None:
+        query = query.filter(models.Booking.booking_id != exclude_booking_id)
+    return query.first()
+
+
+# 予約時間の妥当性と重複をチェックする
+def check_booking_slot(
+    db: Session, room_id: int, start_datetime, end_datetime, exclude_booking_id=None
+):
+    if start_datetime >= end_datetime:
+        raise HTTPException(
+            status_code=400, detail="start_datetime must be before end_datetime"
         )
+    if find_overlapping_booking(
+        db, room_id, start_datetime, end_datetime, exclude_booking_id
+    ):
+        raise HTTPException(
+            status_code=409, detail="The room is already booked for this time slot"
+        )
+
+
+# 会議室の行ロックを取る文
+# SQLite は FOR UPDATE に対応していないため、会議室の行への空の UPDATE で書き込みロックを取る
+def room_lock_statement(db, room_id: int):
+    if db.get_bind().dialect.name == "sqlite":
+        return (
+            update(models.Room.__table__)
+            .where(models.Room.__table__.c.room_id == room_id)
+            .values(room_id=models.Room.__table__.c.room_id)
+        )
+    return (
+        select(models.Room.room_id)
+        .where(models.Room.room_id == room_id)
+        .with_for_update()
+    )
+
+
+# 会議室の行をロックする（commit または rollback まで保持される）
+# 同じ会議室への予約の重複チェックと書き込みはロックの順に直列化され、別の会議室の予約は待たない
+# （SQLite はデータベース単位のロックになる）。
+# MySQL の REPEATABLE READ ではロックより前の読み込みでスナップショットが決まり、
+# ロック待ちの間に commit された予約が重複チェックで見えなくなるため、トランザクションの最初に取る。
+def lock_room(db: Session, room_id: int):
+    db.execute(room_lock_statement(db, room_id))
+
+
+# 予約の登録・変更を会議室のロックの中で行う
+# commit しなかった場合（重複・対象なし・エラー）はすぐに rollback してロックを解放する
+@contextmanager
+def room_admission(db: Session, room_id: int):
+    lock_room(db, room_id)
+    try:
+        yield
+    finally:
+        if db.in_transaction():
+            db.rollback()
+
+
+# 役員専用の部屋の場合、予約するユーザーが役員かどうかをチェックする
+def check_executive_room(db: Session, room_id: int, user_id: int):
+    room = room_catalog.get(db, room_id)
+    if room and room.executive:
+        user = db.query(models.User).filter(models.User.user_id == user_id).first()
         if not user or user.role != "役員":
             raise HTTPException(
                 status_code=400, detail="Only executives can book executive rooms"
             )
 
-    # 予約処理
-    db_booking = models.Booking(
-        user_id=booking.user_id,
-        room_id=booking.room_id,
-        start_datetime=booking.start_datetime,
-        end_datetime=booking.end_datetime,
-    )
-    db.add(db_booking)
-    db.commit()
+
+# 予約を登録する
+def create_booking(db: Session, booking: schemas.BookingCreate):
+    with room_admission(db, booking.room_id):
+        check_executive_room(db, booking.room_id, booking.user_id)
+
+        # 重複予約のチェック（書き込みと同じトランザクション内で行う）
+        check_booking_slot(
+            db, booking.room_id, booking.start_datetime, booking.end_datetime
+        )
+
+        # 予約処理
+        db_booking = models.Booking(
+            user_id=booking.user_id,
+            room_id=booking.room_id,
+            start_datetime=booking.start_datetime,
+            end_datetime=booking.end_datetime,
+        )
+        db.add(db_booking)
+        db.commit()
+    data_versions.bump("bookings")
     db.refresh(db_booking)
     return db_booking
 
 
+# 定期予約で一度に展開できる回数の上限
+MAX_SERIES_OCCURRENCES = 366
+
+
+# 定期予約のルールを各回の (開始, 終了) のリストに展開する
+def expand_series(series: schemas.BookingSeriesCreate):
+    if series.start_datetime >= series.end_datetime:
+        raise HTTPException(
+            status_code=400, detail="start_datetime must be before end_datetime"
+        )
+    if series.count is None and series.until is None:
+        raise HTTPException(status_code=400, detail="count or until is required")
+
+    if series.freq == "DAILY":
+        step = timedelta(days=series.interval)
+    else:
+        step = timedelta(weeks=series.interval)
+    duration = series.end_datetime - series.start_datetime
+    if duration > step:
+        raise HTTPException(
+            status_code=400, detail="Occurrences of the series would overlap"
+        )
+
+    occurrences = []
+    current = series.start_datetime
+    while series.count is None or len(occurrences) < series.count:
+        if series.until is not None and current > series.until:
+            break
+        if len(occurrences) >= MAX_SERIES_OCCURRENCES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"A series can have at most {MAX_SERIES_OCCURRENCES} occurrences",
+            )
+        occurrences.append((current, current + duration))
+        current += step
+    if not occurrences:
+        raise HTTPException(status_code=400, detail="The series has no occurrences")
+    return occurrences
+
+
+# 各回を既存の予約（開始日時順）と照合し、登録可能な回と重複する回に分ける
+def split_series_conflicts(occurrences, existing_rows):
+    starts = [row.start_datetime for row in existing_rows]
+    # 開始日時順に並べたときの終了日時の累積最大値
+    max_ends = []
+    for row in existing_rows:
+        max_ends.append(
+            max(max_ends[-1], row.end_datetime) if max_ends else row.end_datetime
+        )
+
+    accepted, conflicts = [], []
+    for start, end in occurrences:
+        # start < end となる既存予約のうち、最も遅い終了日時が start より後なら重複
+        index = bisect_left(starts, end)
+        if index > 0 and max_ends[index - 1] > start:
+            conflicts.append((start, end))
+        else:
+            accepted.append((start, end))
+    return accepted, conflicts
+
+
 # ユーザーの役割を取得する
 def get_user_role(db: Session, user_id: int) -> str:
     user = db.query(models.User).filter(models.User.user_id == user_id).first()
@@ -114,6 +438,7 @@ def create_guest_user(db: Session, guest_user: schemas.GuestUserCreate):
     )
     db.add(db_guest_user)
     db.commit()
+    data_versions.bump("guest_users")
     db.refresh(db_guest_user)
     return db_guest_user
 
@@ -124,6 +449,8 @@ def delete_user(db: Session, user_id: int):
     if db_user:
         db.delete(db_user)
         db.commit()
+        data_versions.bump("users")
+        token_cache.invalidate_user(user_id)
         return True
     return False
 
@@ -133,7 +460,10 @@ def delete_room(db: Session, room_id: int):
     db_room = db.query(models.Room).filter(models.Room.room_id == room_id).first()
     if db_room:
         db.delete(db_room)
-        db.commit()
+        if not commit_delete(db, models.Room, room_id):
+            return False
+        data_versions.bump("rooms")
+        room_catalog.invalidate()
         return True
     return False
 
@@ -145,7 +475,9 @@ def delete_booking(db: Session, booking_id: int):
     )
     if db_booking:
         db.delete(db_booking)
-        db.commit()
+        if not commit_delete(db, models.Booking, booking_id):
+            return False
+        data_versions.bump("bookings")
         return True
     return False
 
@@ -160,6 +492,7 @@ def delete_guest_user(db: Session, guest_user_id: int):
     if db_guest_user:
         db.delete(db_guest_user)
         db.commit()
+        data_versions.bump("guest_users")
         return True
     return False
 
@@ -177,38 +510,102 @@ def update_user(db: Session, user_id: int, updated_user: schemas.UserUpdate):
         if updated_user.employee_number is not None:
             db_user.employee_number = updated_user.employee_number  # 社員番号の更新
         db.commit()
+        data_versions.bump("users")
         db.refresh(db_user)
+        token_cache.invalidate_user(user_id)
         return db_user
     return None
 
 
+# 楽観的排他制御: If-Match の版数（expected_versions）と現在の版数が違えば 412
+# expected_versions が None（If-Match: *）の場合は照合しない
+def check_version(db_obj, expected_versions):
+    if expected_versions is not None and db_obj.version not in expected_versions:
+        raise HTTPException(
+            status_code=412,
+            detail="The resource has been modified by another request",
+            headers={"ETag": f'"{db_obj.version}"'},
+        )
+
+
+# 版数付きの更新を commit する
+# 読み込んでから commit までに他のリクエストが更新した場合は UPDATE ... WHERE version の
+# 対象が0行になるため、ロックを取らずに 412 にする
+def commit_versioned(db: Session):
+    try:
+        db.commit()
+    except StaleDataError:
+        db.rollback()
+        raise HTTPException(
+            status_code=412,
+            detail="The resource has been modified by another request",
+        )
+
+
+# 版数付きの行の削除を commit する
+# 読み込み後に他で更新されていた場合は 412、既に削除されていた場合は False を返す
+def commit_delete(db: Session, model, primary_key) -> bool:
+    try:
+        commit_versioned(db)
+    except HTTPException:
+        if db.get(model, primary_key, populate_existing=True) is None:
+            return False
+        raise
+    return True
+
+
 # 会議室を更新する
-def update_room(db: Session, room_id: int, updated_room: schemas.RoomUpdate):
+def update_room(
+    db: Session,
+    room_id: int,
+    updated_room: schemas.RoomUpdate,
+    expected_versions=None,
+):
     db_room = db.query(models.Room).filter(models.Room.room_id == room_id).first()
     if db_room:
+        check_version(db_room, expected_versions)
         db_room.room_name = updated_room.room_name
         db_room.capacity = updated_room.capacity
         db_room.photo_url = updated_room.photo_url
         db_room.executive = updated_room.executive
-        db.commit()
+        commit_versioned(db)
+        data_versions.bump("rooms")
         db.refresh(db_room)
+        room_catalog.invalidate()
         return db_room
     return None
 
 
 # 予約を更新する
 def update_booking(
-    db: Session, booking_id: int, updated_booking: schemas.BookingUpdate
+    db: Session,
+    booking_id: int,
+    updated_booking: schemas.BookingUpdate,
+    expected_versions=None,
 ):
-    db_booking = (
-        db.query(models.Booking).filter(models.Booking.booking_id == booking_id).first()
-    )
+    with room_admission(db, updated_booking.room_id):
+        db_booking = (
+            db.query(models.Booking)
+            .filter(models.Booking.booking_id == booking_id)
+            .first()
+        )
+        if db_booking:
+            check_version(db_booking, expected_versions)
+            # 自分自身を除いて重複予約をチェック
+            check_booking_slot(
+                db,
+                updated_booking.room_id,
+                updated_booking.start_datetime,
+                updated_booking.end_datetime,
+                exclude_booking_id=booking_id,
+            )
+            db_booking.user_id = updated_booking.user_id
+            db_booking.room_id = updated_booking.room_id
+            db_booking.start_datetime = updated_booking.start_datetime
+            db_booking.end_datetime = updated_booking.end_datetime
+            commit_versioned(db)
     if db_booking:
-        db_booking.user_id = updated_booking.user_id
-        db_booking.room_id = updated_booking.room_id
-        db_booking.start_datetime = updated_booking.start_datetime
-        db_booking.end_datetime = updated_booking.end_datetime
-        db.commit()
+        data_versions.bump("bookings")
         db.refresh(db_booking)
         return db_booking
     return None
@@ -227,45 +624,54 @@ def update_guest_user(
         db_guest_user.name = updated_guest_user.name
         db_guest_user.booking_id = updated_guest_user.booking_id
         db.commit()
+        data_versions.bump("guest_users")
         db.refresh(db_guest_user)
         return db_guest_user
     return None
 
 
 def get_executive_rooms(db: Session, skip: int = 0, limit: int = 100):
-    return (
-        db.query(models.Room)
-        .filter(models.Room.executive == True)
-        .offset(skip)
-        .limit(limit)
-        .all()
-    )
+    rooms = [room for room in room_catalog.rooms(db) if room.executive]
+    return rooms[skip : skip + limit]
 
 
 def create_executive_room(db: Session, room: schemas.RoomCreate):
-    db_room = models.Room(**room.dict(), executive=True)
+    db_room = models.Room(**room.dict(exclude={"executive"}), executive=True)
     db.add(db_room)
     db.commit()
+    data_versions.bump("rooms")
     db.refresh(db_room)
+    room_catalog.invalidate()
     return db_room
 
 
-def update_executive_room(db: Session, room_id: int, updated_room: schemas.RoomUpdate):
-    db_room = db.query(models.Room).filter(models.Room.id == room_id).first()
+def update_executive_room(
+    db: Session,
+    room_id: int,
+    updated_room: schemas.RoomUpdate,
+    expected_versions=None,
+):
+    db_room = db.query(models.Room).filter(models.Room.room_id == room_id).first()
     if db_room is not None:
+        check_version(db_room, expected_versions)
         for var, value in vars(updated_room).items():
             setattr(db_room, var, value) if value else None
-        db.commit()
+        commit_versioned(db)
+        data_versions.bump("rooms")
         db.refresh(db_room)
+        room_catalog.invalidate()
         return db_room
     return None
 
 
 def delete_executive_room(db: Session, room_id: int):
-    db_room = db.query(models.Room).filter(models.Room.id == room_id).first()
+    db_room = db.query(models.Room).filter(models.Room.room_id == room_id).first()
     if db_room is not None:
         db.delete(db_room)
-        db.commit()
+        if not commit_delete(db, models.Room, room_id):
+            return False
+        data_versions.bump("rooms")
+        room_catalog.invalidate()
         return True
     return False
 
@@ -286,6 +692,7 @@ def create_booking_with_auto_generated_id(
     )
     db.add(new_booking)
     db.commit()
+    data_versions.bump("bookings")
     db.refresh(new_booking)
     return new_booking.booking_id  # 生成された booking_id を返す
 
@@ -295,13 +702,35 @@ def create_guest_user_with_booking_id(db: Session, name, booking_id):
     guest_user = GuestUser(name=name, booking_id=booking_id)
     db.add(guest_user)
     db.commit()
+    data_versions.bump("guest_users")
     db.refresh(guest_user)
     return guest_user
 
 
 # ゲストユーザー一覧を取得する
-def get_guest_users(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.GuestUser).offset(skip).limit(limit).all()
+def get_guest_users(db: Session, skip: int = 0, limit: int = 100, cursor: str = None):
+    query = db.query(models.GuestUser).order_by(models.GuestUser.guest_user_id)
+    if cursor is not None:
+        (last_guest_user_id,) = decode_cursor(cursor, int)
+        query = query.filter(models.GuestUser.guest_user_id > last_guest_user_id)
+    else:
+        query = query.offset(skip)
+    return query.limit(limit).all()
+
+
+# ゲストユーザー一覧を Core の行（dict）で取得する
+def get_guest_user_rows(
+    db: Session, skip: int = 0, limit: int = 100, cursor: str = None
+):
+    stmt = select(
+        GuestUser.name, GuestUser.guest_user_id, GuestUser.booking_id
+    ).order_by(GuestUser.guest_user_id)
+    if cursor is not None:
+        (last_guest_user_id,) = decode_cursor(cursor, int)
+        stmt = stmt.where(GuestUser.guest_user_id > last_guest_user_id)
+    else:
+        stmt = stmt.offset(skip)
+    return [row._asdict() for row in db.connection().execute(stmt.limit(limit))]
 
 
 # 複数のゲストユーザーを登録する関数
@@ -312,6 +741,7 @@ def create_guest_users_with_booking_id(
         db_guest_user = models.GuestUser(name=guest_user.name, booking_id=booking_id)
         db.add(db_guest_user)
     db.commit()
+    data_versions.bump("guest_users")
     return (
         db.query(models.GuestUser)
         .filter(models.GuestUser.booking_id == booking_id)
@@ -321,59 +751,78 @@ def create_guest_users_with_booking_id(
 
 # 予約時のキャパシティチェックを行う関数
 def check_room_capacity(db: Session, room_id: int, number_of_guests: int) -> bool:
-    room = db.query(models.Room).filter(models.Room.room_id == room_id).first()
+    room = room_catalog.get(db, room_id)
     if room and room.capacity >= number_of_guests:
         return True
     return False
 
 
-# 予約とゲストの登録を行う関数
+# 予約とメンバー・ゲストの登録を1トランザクションで行う関数
 def create_booking_with_members(db: Session, booking_data: schemas.BookingCreate):
-    # 代表者（社員）の存在チェック
-    main_user = (
-        db.query(models.User)
-        .filter(models.User.employee_number == booking_data.main_user_employee_number)
-        .first()
-    )
-    if not main_user:
-        raise HTTPException(status_code=404, detail="Main user not found")
-
-    # 予約の作成
-    new_booking = models.Booking(
-        main_user_id=main_user.user_id,
-        room_id=booking_data.room_id,
-        start_datetime=booking_data.start_datetime,
-        end_datetime=booking_data.end_datetime,
-    )
-    db.add(new_booking)
-    db.commit()
-    db.refresh(new_booking)
-
-    # 追加メンバー（社員）の登録
-    for employee_number in booking_data.member_employee_numbers:
-        user = (
-            db.query(models.User)
-            .filter(models.User.employee_number == employee_number)
-            .first()
+    with room_admission(db, booking_data.room_id):
+        check_executive_room(db, booking_data.room_id, booking_data.user_id)
+        check_booking_slot(
+            db,
+            booking_data.room_id,
+            booking_data.start_datetime,
+            booking_data.end_datetime,
         )
-        if user:
-            booking_user = models.BookingUsers(
-                booking_id=new_booking.booking_id, user_id=user.user_id
-            )
-            db.add(booking_user)
 
-    # ゲストの登録
-    for guest_name in booking_data.guest_names:
-        guest_user = models.GuestUser(
-            name=guest_name, booking_id=new_booking.booking_id
+        # 代表者と追加メンバーの社員番号を IN 句の1クエリでまとめて解決する
+        member_numbers = list(dict.fromkeys(booking_data.member_employee_numbers))
+        users_by_number = {
+            user.employee_number: user
+            for user in db.query(models.User)
+            .filter(
+                models.User.employee_number.in_(
+                    [booking_data.main_user_employee_number, *member_numbers]
+                )
+            )
+            .all()
+        }
+        main_user = users_by_number.get(booking_data.main_user_employee_number)
+        if not main_user:
+            raise HTTPException(status_code=404, detail="Main user not found")
+
+        # 予約の作成（flush で booking_id を採番し、commit は最後に1回だけ行う）
+        new_booking = models.Booking(
+            user_id=booking_data.user_id,
+            main_user_id=main_user.user_id,
+            room_id=booking_data.room_id,
+            start_datetime=booking_data.start_datetime,
+            end_datetime=booking_data.end_datetime,
         )
-        db.add(guest_user)
+        db.add(new_booking)
+        db.flush()
 
-    db.commit()
+        member_rows, guest_rows = booking_member_rows(
+            new_booking.booking_id, booking_data, member_numbers, users_by_number
+        )
+        if member_rows:
+            db.execute(insert(models.BookingUsers), member_rows)
+        if guest_rows:
+            db.execute(insert(models.GuestUser), guest_rows)
 
+        db.commit()
+    data_versions.bump("bookings", "guest_users")
+    db.refresh(new_booking)
     return new_booking
 
 
+# 予約に紐づく追加メンバー（登録済みの社員のみ）とゲストの挿入用の行を作る
+def booking_member_rows(booking_id, booking_data, member_numbers, users_by_number):
+    member_rows = [
+        {"booking_id": booking_id, "user_id": users_by_number[number].user_id}
+        for number in member_numbers
+        if number in users_by_number
+    ]
+    guest_rows = [
+        {"booking_id": booking_id, "name": guest_name}
+        for guest_name in booking_data.guest_names
+    ]
+    return member_rows, guest_rows
+
+
 # 特定の会議室をIDで取得する関数
 def get_room_by_id(db: Session, room_id: int):
-    return db.query(models.Room).filter(models.Room.room_id == room_id).first()
+    return room_catalog.get(db, room_id)
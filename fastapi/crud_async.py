@@ -0,0 +1,700 @@
+# crud_async.py
+# crud.py の非同期版（AsyncSession 用）
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import exists, func, insert, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.exc import StaleDataError
+import models, schemas
+from crud import (
+    booking_cursor_filter,
+    booking_filters,
+    booking_member_rows,
+    booking_order,
+    check_version,
+    room_lock_statement,
+    expand_series,
+    split_series_conflicts,
+    sweep_free_slots,
+)
+from fastapi import HTTPException
+from security import (
+    hash_password_async,
+    hash_passwords_parallel,
+    verify_password_async,
+)
+from auth_cache import token_cache
+from room_cache import room_catalog
+from etag import data_versions
+from analytics import (
+    BUCKET_SECONDS,
+    BUCKETS,
+    greatest,
+    least,
+    spread_utilization_rows,
+    whole_seconds_between,
+)
+from export import EXPORT_COLUMNS
+
+
+# ユーザー認証を行う（bcrypt の検証はワーカースレッドで実行する）
+async def authenticate_user(db: AsyncSession, employee_number: str, password: str):
+    user = await get_user_by_employee_number(db, employee_number)
+    if user and await verify_password_async(password, user.password_hash):
+        return user
+    return None
+
+
+# ユーザーを登録する
+async def create_user(db: AsyncSession, user: schemas.UserCreate):
+    db_user = models.User(
+        username=user.username,
+        password_hash=await hash_password_async(user.password),
+        role=user.role,
+        employee_number=user.employee_number,
+    )
+    db.add(db_user)
+    await db.commit()
+    data_versions.bump("users")
+    await db.refresh(db_user)
+    return db_user
+
+
+# ユーザーを更新する
+async def update_user(db: AsyncSession, user_id: int, updated_user: schemas.UserUpdate):
+    db_user = await get_user(db, user_id)
+    if db_user:
+        if updated_user.username is not None:
+            db_user.username = updated_user.username
+        if updated_user.role is not None:
+            db_user.role = updated_user.role
+        if updated_user.password is not None:
+            db_user.password_hash = await hash_password_async(updated_user.password)
+        if updated_user.employee_number is not None:
+            db_user.employee_number = updated_user.employee_number
+        await db.commit()
+        data_versions.bump("users")
+        await db.refresh(db_user)
+        token_cache.invalidate_user(user_id)
+        return db_user
+    return None
+
+
+# ユーザーをIDで取得する
+async def get_user(db: AsyncSession, user_id: int):
+    return await db.get(models.User, user_id)
+
+
+# ユーザーを社員番号で取得する
+async def get_user_by_employee_number(db: AsyncSession, employee_number: str):
+    result = await db.execute(
+        select(models.User).where(models.User.employee_number == employee_number)
+    )
+    return result.scalars().first()
+
+
+# 複数の社員番号からユーザーを IN 句の1クエリでまとめて取得する
+async def get_users_by_employee_numbers(db: AsyncSession, employee_numbers: list):
+    if not employee_numbers:
+        return []
+    result = await db.execute(
+        select(models.User).where(models.User.employee_number.in_(employee_numbers))
+    )
+    return result.scalars().all()
+
+
+# ユーザーを一括登録する（users は (行番号, UserCreate) のリスト）
+# 社員番号・ユーザー名の重複は1クエリで確認し、パスワードはプロセスプールで並列にハッシュ化して、
+# 登録は1回の executemany で行う
+# 戻り値は 行番号 → user_id と 行番号 → エラーメッセージ
+async def create_users_bulk(db: AsyncSession, users: list):
+    errors = {}
+    seen_numbers, seen_names = set(), set()
+    for row_number, user in users:
+        if user.employee_number in seen_numbers:
+            errors[row_number] = "Duplicate employee_number in request"
+        elif user.username in seen_names:
+            errors[row_number] = "Duplicate username in request"
+        seen_numbers.add(user.employee_number)
+        seen_names.add(user.username)
+
+    result = await db.execute(
+        select(models.User.employee_number, models.User.username).where(
+            or_(
+                models.User.employee_number.in_(seen_numbers),
+                models.User.username.in_(seen_names),
+            )
+        )
+    )
+    taken_numbers, taken_names = set(), set()
+    for employee_number, username in result:
+        taken_numbers.add(employee_number)
+        taken_names.add(username)
+
+    accepted = []
+    for row_number, user in users:
+        if row_number in errors:
+            continue
+        if user.employee_number in taken_numbers:
+            errors[row_number] = "employee_number already registered"
+        elif user.username in taken_names:
+            errors[row_number] = "username already registered"
+        else:
+            accepted.append((row_number, user))
+    if not accepted:
+        return {}, errors
+
+    password_hashes = await hash_passwords_parallel(
+        [user.password for _, user in accepted]
+    )
+    try:
+        await db.execute(
+            insert(models.User),
+            [
+                {
+                    "username": user.username,
+                    "role": user.role,
+                    "employee_number": user.employee_number,
+                    "password_hash": password_hash,
+                }
+                for (_, user), password_hash in zip(accepted, password_hashes)
+            ],
+        )
+        created = await get_users_by_employee_numbers(
+            db, [user.employee_number for _, user in accepted]
+        )
+        await db.commit()
+        data_versions.bump("users")
+    except IntegrityError:
+        # 確認後に他のリクエストが同じ社員番号・ユーザー名を登録した場合
+        await db.rollback()
+        raise HTTPException(
+            status_code=409, detail="Users were registered concurrently, retry"
+        )
+    ids_by_number = {user.employee_number: user.user_id for user in created}
+    created_ids = {
+        row_number: ids_by_number[user.employee_number] for row_number, user in accepted
+    }
+    return created_ids, errors
+
+
+# 会議室を登録する（executive=True の場合は役員専用の部屋として登録する）
+async def create_room(db: AsyncSession, room: schemas.RoomCreate, executive=None):
+    values = room.model_dump()
+    if executive is not None:
+        values["executive"] = executive
+    db_room = models.Room(**values)
+    db.add(db_room)
+    await db.commit()
+    data_versions.bump("rooms")
+    await db.refresh(db_room)
+    room_catalog.invalidate()
+    return db_room
+
+
+# 特定の会議室をIDで取得する
+async def get_room_by_id(db: AsyncSession, room_id: int):
+    return await room_catalog.get_async(db, room_id)
+
+
+# 特定の予約をIDで取得する
+async def get_booking_by_id(db: AsyncSession, booking_id: int):
+    return await db.get(models.Booking, booking_id)
+
+
+# 予約と一緒に読み込めるリレーション（participants は参加者3種の別名）
+BOOKING_RELATIONS = ("room", "main_user", "members", "guests")
+BOOKING_INCLUDE_ALIASES = {"participants": ("main_user", "members", "guests")}
+
+
+# include=room,members のようなカンマ区切りの指定をリレーション名のタプルにする
+def parse_booking_include(include: str = None):
+    names = []
+    for name in filter(None, (part.strip() for part in (include or "").split(","))):
+        expanded = BOOKING_INCLUDE_ALIASES.get(name, (name,))
+        for relation in expanded:
+            if relation not in BOOKING_RELATIONS:
+                raise HTTPException(status_code=400, detail=f"Unknown include: {name}")
+            names.append(relation)
+    return tuple(dict.fromkeys(names))
+
+
+# リレーションごとに IN 句の SELECT を1回ずつ発行する（予約件数によらずクエリ数は一定）
+def booking_load_options(include):
+    return [selectinload(getattr(models.Booking, name)) for name in include]
+
+
+# 予約1件を会議室・代表者・メンバー・ゲスト込みで取得する
+async def get_booking_detail(db: AsyncSession, booking_id: int):
+    result = await db.execute(
+        select(models.Booking)
+        .where(models.Booking.booking_id == booking_id)
+        .options(*booking_load_options(BOOKING_RELATIONS))
+    )
+    return result.scalar_one_or_none()
+
+
+# 予約一覧の1ページ分の SELECT 文に絞り込み・並び順・カーソル（または offset）・件数を付ける
+def booking_page_statement(
+    stmt, skip: int, limit: int, cursor: str, descending: bool, filters: dict
+):
+    stmt = stmt.where(*booking_filters(**filters)).order_by(*booking_order(descending))
+    if cursor is not None:
+        stmt = stmt.where(booking_cursor_filter(cursor, descending))
+    else:
+        stmt = stmt.offset(skip)
+    return stmt.limit(limit)
+
+
+# 予約一覧を取得する（include で指定したリレーションをページ単位でまとめて読み込む）
+# filters には room_id / user_id / start_from / start_to / executive_only を渡す
+async def get_booking(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: str = None,
+    include: tuple = (),
+    descending: bool = False,
+    **filters,
+):
+    stmt = select(models.Booking).options(*booking_load_options(include))
+    result = await db.execute(
+        booking_page_statement(stmt, skip, limit, cursor, descending, filters)
+    )
+    return result.scalars().all()
+
+
+# 予約一覧を ORM のオブジェクトを作らずに Core の行（dict）で取得する（一覧の高速なレスポンス用）
+async def get_booking_rows(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: str = None,
+    descending: bool = False,
+    **filters,
+):
+    stmt = select(*(getattr(models.Booking, column) for column in EXPORT_COLUMNS))
+    connection = await db.connection()
+    result = await connection.execute(
+        booking_page_statement(stmt, skip, limit, cursor, descending, filters)
+    )
+    return [row._asdict() for row in result]
+
+
+# エクスポート用に予約を開始日時順に少しずつ取得する（start_from 以上 start_to 未満）
+# stream_results のサーバーサイドカーソルから yield_per 件ずつ読むため、
+# 件数によらずメモリ使用量は一定になる
+async def stream_booking_rows(
+    db: AsyncSession, start_from=None, start_to=None, batch_size: int = 1000
+):
+    stmt = (
+        select(*(getattr(models.Booking, column) for column in EXPORT_COLUMNS))
+        .where(*booking_filters(start_from=start_from, start_to=start_to))
+        .order_by(*booking_order())
+        .execution_options(stream_results=True, yield_per=batch_size)
+    )
+    result = await db.stream(stmt)
+    async for rows in result.partitions():
+        yield rows
+
+
+# 指定した時間帯に重なる予約を1件取得する（半開区間 [start, end) で判定）
+async def find_overlapping_booking(
+    db: AsyncSession,
+    room_id: int,
+    start_datetime,
+    end_datetime,
+    exclude_booking_id=None,
+):
+    stmt = select(models.Booking.booking_id).where(
+        models.Booking.room_id == room_id,
+        models.Booking.start_datetime < end_datetime,
+        models.Booking.end_datetime > start_datetime,
+    )
+    if exclude_booking_id is not None:
+        stmt = stmt.where(models.Booking.booking_id != exclude_booking_id)
+    result = await db.execute(stmt.limit(1))
+    return result.first()
+
+
+# 予約時間の妥当性と重複をチェックする
+async def check_booking_slot(
+    db: AsyncSession,
+    room_id: int,
+    start_datetime,
+    end_datetime,
+    exclude_booking_id=None,
+):
+    if start_datetime >= end_datetime:
+        raise HTTPException(
+            status_code=400, detail="start_datetime must be before end_datetime"
+        )
+    if await find_overlapping_booking(
+        db, room_id, start_datetime, end_datetime, exclude_booking_id
+    ):
+        raise HTTPException(
+            status_code=409, detail="The room is already booked for this time slot"
+        )
+
+
+# 会議室の行をロックする（crud.lock_room と同じく、トランザクションの最初に取る）
+async def lock_room(db: AsyncSession, room_id: int):
+    await db.execute(room_lock_statement(db, room_id))
+
+
+# 予約の登録・変更を会議室のロックの中で行う
+# commit しなかった場合（重複・対象なし・エラー）はすぐに rollback してロックを解放する
+@asynccontextmanager
+async def room_admission(db: AsyncSession, room_id: int):
+    await lock_room(db, room_id)
+    try:
+        yield
+    finally:
+        if db.in_transaction():
+            await db.rollback()
+
+
+# 役員専用の部屋の場合、予約するユーザーが役員かどうかをチェックする
+async def check_executive_room(db: AsyncSession, room_id: int, user_id: int):
+    room = await get_room_by_id(db, room_id)
+    if room and room.executive:
+        user = await get_user(db, user_id)
+        if not user or user.role != "役員":
+            raise HTTPException(
+                status_code=400, detail="Only executives can book executive rooms"
+            )
+
+
+# 予約を登録する
+async def create_booking(db: AsyncSession, booking: schemas.BookingCreate):
+    async with room_admission(db, booking.room_id):
+        await check_executive_room(db, booking.room_id, booking.user_id)
+
+        # 重複予約のチェック（書き込みと同じトランザクション内で行う）
+        await check_booking_slot(
+            db, booking.room_id, booking.start_datetime, booking.end_datetime
+        )
+
+        # 予約処理
+        db_booking = models.Booking(
+            user_id=booking.user_id,
+            room_id=booking.room_id,
+            start_datetime=booking.start_datetime,
+            end_datetime=booking.end_datetime,
+        )
+        db.add(db_booking)
+        await db.commit()
+    data_versions.bump("bookings")
+    await db.refresh(db_booking)
+    return db_booking
+
+
+# 予約とメンバー・ゲストの登録を1トランザクションで行う
+async def create_booking_with_members(
+    db: AsyncSession, booking_data: schemas.BookingCreate
+):
+    async with room_admission(db, booking_data.room_id):
+        await check_executive_room(db, booking_data.room_id, booking_data.user_id)
+        await check_booking_slot(
+            db,
+            booking_data.room_id,
+            booking_data.start_datetime,
+            booking_data.end_datetime,
+        )
+
+        # 代表者と追加メンバーの社員番号を IN 句の1クエリでまとめて解決する
+        member_numbers = list(dict.fromkeys(booking_data.member_employee_numbers))
+        result = await db.execute(
+            select(models.User).where(
+                models.User.employee_number.in_(
+                    [booking_data.main_user_employee_number, *member_numbers]
+                )
+            )
+        )
+        users_by_number = {user.employee_number: user for user in result.scalars()}
+        main_user = users_by_number.get(booking_data.main_user_employee_number)
+        if not main_user:
+            raise HTTPException(status_code=404, detail="Main user not found")
+
+        # 予約の作成（flush で booking_id を採番し、commit は最後に1回だけ行う）
+        new_booking = models.Booking(
+            user_id=booking_data.user_id,
+            main_user_id=main_user.user_id,
+            room_id=booking_data.room_id,
+            start_datetime=booking_data.start_datetime,
+            end_datetime=booking_data.end_datetime,
+        )
+        db.add(new_booking)
+        await db.flush()
+
+        member_rows, guest_rows = booking_member_rows(
+            new_booking.booking_id, booking_data, member_numbers, users_by_number
+        )
+        if member_rows:
+            await db.execute(insert(models.BookingUsers), member_rows)
+        if guest_rows:
+            await db.execute(insert(models.GuestUser), guest_rows)
+
+        await db.commit()
+    data_versions.bump("bookings", "guest_users")
+    return new_booking
+
+
+# 期間にかかる予約の (room_id, start_datetime, end_datetime) を1クエリで取得する
+async def get_booking_ranges(db: AsyncSession, start_datetime, end_datetime):
+    result = await db.execute(
+        select(
+            models.Booking.room_id,
+            models.Booking.start_datetime,
+            models.Booking.end_datetime,
+        ).where(
+            models.Booking.start_datetime < end_datetime,
+            models.Booking.end_datetime > start_datetime,
+        )
+    )
+    return result.all()
+
+
+# 期間内の予約時間を、開始バケット（日 / 時間）とバケット数ごとに GROUP BY で集計する
+# バケットは utc_offset_minutes だけずらした現地時刻で、期間の開始日の 0 時から数える。
+# group_by が room / room_hour の場合は会議室ごとに分ける。
+# 各行の意味と、日・時間帯ごとの行への展開は analytics.spread_utilization_rows を参照。
+async def get_utilization_buckets(
+    db: AsyncSession, window_start, window_end, group_by: str, utc_offset_minutes=0
+):
+    offset = timedelta(minutes=utc_offset_minutes)
+    origin = datetime.combine((window_start + offset).date(), datetime.min.time())
+    origin -= offset
+    clipped = (
+        select(
+            models.Booking.room_id,
+            whole_seconds_between(
+                origin, greatest(models.Booking.start_datetime, window_start)
+            ).label("start_offset"),
+            whole_seconds_between(
+                origin, least(models.Booking.end_datetime, window_end)
+            ).label("end_offset"),
+        )
+        .join(models.Room, models.Room.room_id == models.Booking.room_id)
+        .where(
+            models.Booking.start_datetime < window_end,
+            models.Booking.end_datetime > window_start,
+        )
+        # OFFSET 0 でサブクエリを外側に展開させず、各予約の秒数の計算を1回にする
+        .offset(0)
+        .subquery()
+    )
+    bucket = BUCKETS[group_by]
+    bucket_seconds = BUCKET_SECONDS[bucket]
+    first = clipped.c.start_offset // bucket_seconds
+    last = (clipped.c.end_offset - 1) // bucket_seconds
+    keys = [
+        (first if bucket == "day" else first % 24).label("first"),
+        (last - first).label("span"),
+    ]
+    if group_by in ("room", "room_hour"):
+        keys.insert(0, clipped.c.room_id)
+    result = await db.execute(
+        select(
+            *keys,
+            func.count().label("booking_count"),
+            func.sum(clipped.c.start_offset - first * bucket_seconds).label(
+                "head_seconds"
+            ),
+            func.sum(clipped.c.end_offset - last * bucket_seconds).label(
+                "tail_seconds"
+            ),
+        ).group_by(*keys)
+    )
+    return result.all()
+
+
+# 期間内の予約時間を集計する
+# group_by: room（会議室ごと）/ day（日ごと）/ hour（時間帯ごと）/ room_hour
+async def get_utilization_rows(
+    db: AsyncSession, window_start, window_end, group_by: str, utc_offset_minutes=0
+):
+    rows = await get_utilization_buckets(
+        db, window_start, window_end, group_by, utc_offset_minutes
+    )
+    first_day = (window_start + timedelta(minutes=utc_offset_minutes)).date()
+    return spread_utilization_rows(rows, group_by, first_day)
+
+
+# 定期予約を一括で登録する
+# 既存予約との照合は部屋ごとに1回の範囲クエリ、登録は executemany の1文で行う
+async def create_booking_series(db: AsyncSession, series: schemas.BookingSeriesCreate):
+    occurrences = expand_series(series)
+    async with room_admission(db, series.room_id):
+        await check_executive_room(db, series.room_id, series.user_id)
+
+        result = await db.execute(
+            select(models.Booking.start_datetime, models.Booking.end_datetime)
+            .where(
+                models.Booking.room_id == series.room_id,
+                models.Booking.start_datetime < occurrences[-1][1],
+                models.Booking.end_datetime > occurrences[0][0],
+            )
+            .order_by(models.Booking.start_datetime)
+        )
+        accepted, conflicts = split_series_conflicts(occurrences, result.all())
+
+        db_series = models.BookingSeries(**series.dict())
+        db.add(db_series)
+        await db.flush()
+        if accepted:
+            await db.execute(
+                insert(models.Booking),
+                [
+                    {
+                        "user_id": series.user_id,
+                        "room_id": series.room_id,
+                        "start_datetime": start,
+                        "end_datetime": end,
+                        "series_id": db_series.series_id,
+                    }
+                    for start, end in accepted
+                ],
+            )
+        await db.commit()
+    data_versions.bump("bookings")
+
+    result = await db.execute(
+        select(models.Booking)
+        .where(models.Booking.series_id == db_series.series_id)
+        .order_by(models.Booking.start_datetime)
+    )
+    return db_series, result.scalars().all(), conflicts
+
+
+# 版数付きの更新を commit する（他のリクエストが先に更新していれば 412）
+async def commit_versioned(db: AsyncSession):
+    try:
+        await db.commit()
+    except StaleDataError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=412,
+            detail="The resource has been modified by another request",
+        )
+
+
+# 版数付きの行の削除を commit する
+# 読み込み後に他で更新されていた場合は 412、既に削除されていた場合は False を返す
+async def commit_delete(db: AsyncSession, model, primary_key) -> bool:
+    try:
+        await commit_versioned(db)
+    except HTTPException:
+        if await db.get(model, primary_key, populate_existing=True) is None:
+            return False
+        raise
+    return True
+
+
+# 予約を更新する
+async def update_booking(
+    db: AsyncSession,
+    booking_id: int,
+    updated_booking: schemas.BookingUpdate,
+    expected_versions=None,
+):
+    async with room_admission(db, updated_booking.room_id):
+        db_booking = await get_booking_by_id(db, booking_id)
+        if db_booking:
+            check_version(db_booking, expected_versions)
+            # 自分自身を除いて重複予約をチェック
+            await check_booking_slot(
+                db,
+                updated_booking.room_id,
+                updated_booking.start_datetime,
+                updated_booking.end_datetime,
+                exclude_booking_id=booking_id,
+            )
+            db_booking.user_id = updated_booking.user_id
+            db_booking.room_id = updated_booking.room_id
+            db_booking.start_datetime = updated_booking.start_datetime
+            db_booking.end_datetime = updated_booking.end_datetime
+            await commit_versioned(db)
+    if db_booking:
+        data_versions.bump("bookings")
+        await db.refresh(db_booking)
+        return db_booking
+    return None
+
+
+# 予約を削除する
+async def delete_booking(db: AsyncSession, booking_id: int):
+    db_booking = await get_booking_by_id(db, booking_id)
+    if db_booking:
+        await db.delete(db_booking)
+        if not await commit_delete(db, models.Booking, booking_id):
+            return False
+        data_versions.bump("bookings")
+        return True
+    return False
+
+
+# ゲストユーザーを登録する
+async def create_guest_user(db: AsyncSession, guest_user: schemas.GuestUserCreate):
+    db_guest_user = models.GuestUser(
+        name=guest_user.name, booking_id=guest_user.booking_id
+    )
+    db.add(db_guest_user)
+    await db.commit()
+    data_versions.bump("guest_users")
+    await db.refresh(db_guest_user)
+    return db_guest_user
+
+
+# 指定した時間帯に空いている会議室を取得する（NOT EXISTS の反結合）
+async def get_available_rooms(
+    db: AsyncSession, start_datetime, end_datetime, min_capacity=None, executive=None
+):
+    conflict = exists().where(
+        models.Booking.room_id == models.Room.room_id,
+        models.Booking.start_datetime < end_datetime,
+        models.Booking.end_datetime > start_datetime,
+    )
+    stmt = select(models.Room).where(~conflict)
+    if min_capacity is not None:
+        stmt = stmt.where(models.Room.capacity >= min_capacity)
+    if executive is not None:
+        stmt = stmt.where(models.Room.executive == executive)
+    result = await db.execute(stmt.order_by(models.Room.room_id))
+    return result.scalars().all()
+
+
+# 条件に合う会議室を取得する（空き状況は問わない）
+async def get_rooms_by_condition(db: AsyncSession, min_capacity=None, executive=None):
+    stmt = select(models.Room)
+    if min_capacity is not None:
+        stmt = stmt.where(models.Room.capacity >= min_capacity)
+    if executive is not None:
+        stmt = stmt.where(models.Room.executive == executive)
+    result = await db.execute(stmt.order_by(models.Room.room_id))
+    return result.scalars().all()
+
+
+# 会議室ごとに start 以降の空き時間帯を最大 count 件求める
+async def get_free_slots(
+    db: AsyncSession, room_ids, start_datetime, duration, count, horizon_end
+):
+    result = await db.execute(
+        select(
+            models.Booking.room_id,
+            models.Booking.start_datetime,
+            models.Booking.end_datetime,
+        )
+        .where(
+            models.Booking.room_id.in_(room_ids),
+            models.Booking.start_datetime < horizon_end,
+            models.Booking.end_datetime > start_datetime,
+        )
+        .order_by(models.Booking.room_id, models.Booking.start_datetime)
+    )
+    return sweep_free_slots(
+        result.all(), room_ids, start_datetime, duration, count, horizon_end
+    )
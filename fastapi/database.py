@@ -1,29 +1,90 @@
 # database.py
+import time
+
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from models import Base
+from settings import settings
+
+
+# プールからの接続取得にかかった待ち時間を記録するミックスイン
+class PoolWaitMetricsMixin:
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - started
+            self.wait_count += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+
+class MeteredQueuePool(PoolWaitMetricsMixin, QueuePool):
+    pass
+
+
+class MeteredAsyncAdaptedQueuePool(PoolWaitMetricsMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+# エンジン作成時の共通オプション
+# SQLite（テスト用）の場合はプール設定を使わない
+def engine_options(url: str, poolclass) -> dict:
+    options = {"echo": settings.echo}
+    if url.startswith("sqlite"):
+        return options
+    options.update(
+        poolclass=poolclass,
+        pool_size=settings.pool_size,
+        max_overflow=settings.max_overflow,
+        pool_timeout=settings.pool_timeout,
+        pool_recycle=settings.pool_recycle,
+        pool_pre_ping=settings.pool_pre_ping,
+    )
+    return options
 
-# Docker Composeで設定したMySQLへの接続情報を設定
-username = "user"  # Docker Composeファイルで設定したユーザー名
-password = "userpassword"  # Docker Composeファイルで設定したパスワード
-host = "localhost"  # ホストマシンを指定
-database = "mydatabase"  # Docker Composeファイルで設定したデータベース名
 
 # SQLAlchemyエンジンを作成
 engine = create_engine(
-    f"mysql+pymysql://{username}:{password}@{host}/{database}", echo=True
+    settings.database_url, **engine_options(settings.database_url, MeteredQueuePool)
 )
 
+# 非同期用のSQLAlchemyエンジンを作成（aiomysql ドライバを使用）
+async_engine = create_async_engine(
+    settings.async_database_url,
+    **engine_options(settings.async_database_url, MeteredAsyncAdaptedQueuePool),
+)
 
-# Docker Composeで設定したMySQLへの接続情報を設定
-# username = "root"  # Docker Composeファイルで設定したユーザー名
-# password = "Pass.kana11"  # Docker Composeファイルで設定したパスワード
-# host = "database1.c4eexno6zabj.us-east-1.rds.amazonaws.com"  # ホストマシンを指定
-# database = "database2"  # Docker Composeファイルで設定したデータベース名
 
-# SQLAlchemyエンジンを作成
-# engine = create_engine(
-#     f"mysql+pymysql://{username}:{password}@{host}/{database}", echo=True
-# )
+# コネクションプールの状態を取得する
+def pool_stats(pool) -> dict:
+    stats = {"status": pool.status()}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+        )
+    if isinstance(pool, PoolWaitMetricsMixin):
+        stats.update(
+            wait_count=pool.wait_count,
+            wait_total_ms=round(pool.wait_total * 1000, 3),
+            wait_avg_ms=round(pool.wait_total * 1000 / pool.wait_count, 3)
+            if pool.wait_count
+            else 0.0,
+            wait_max_ms=round(pool.wait_max * 1000, 3),
+        )
+    return stats
+
 
 # テーブルの削除
 # Base.metadata.drop_all(engine)
@@ -0,0 +1,103 @@
+# etag.py
+import hashlib
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Optional
+
+from fastapi import HTTPException, Request, Response
+
+from settings import settings
+
+
+# テーブルごとの版数（プロセス内カウンター）
+# crud の書き込み関数が commit 後に bump し、参照系の ETag はこの版数から作る。
+# カウンターはワーカーごとに持つため ETag にワーカーの ID を含め、
+# 他のワーカーでの更新は ttl 秒ごとに ETag を切り替えることで反映する。
+class DataVersions:
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._worker_id = uuid.uuid4().hex[:8]
+        self._versions = defaultdict(int)
+        self._lock = threading.Lock()
+
+    # テーブルの書き込み後に呼び出す
+    def bump(self, *tables: str):
+        with self._lock:
+            for table in tables:
+                self._versions[table] += 1
+
+    def version(self, table: str) -> int:
+        return self._versions[table]
+
+    # テーブルの版数とリクエストの URL（パスとクエリ）から弱い ETag を作る
+    def etag(self, tables, url: str) -> str:
+        epoch = int(time.time() // self.ttl) if self.ttl > 0 else 0
+        versions = ".".join(str(self._versions[table]) for table in tables)
+        digest = hashlib.blake2b(url.encode(), digest_size=8).hexdigest()
+        return f'W/"{self._worker_id}-{epoch}-{versions}-{digest}"'
+
+
+data_versions = DataVersions(settings.etag_ttl)
+
+
+# If-None-Match に ETag が含まれるか（弱い比較）
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    weak_etag = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == weak_etag
+        for candidate in if_none_match.split(",")
+    )
+
+
+# 条件付き GET の依存関係を作る（tables はレスポンスの内容が依存するテーブル）
+# ETag が一致すればクエリを実行せずに 304 を返し、一致しなければ ETag ヘッダーを付ける
+def conditional_get(*tables: str):
+    def check_etag(request: Request, response: Response) -> str:
+        url = request.url.path
+        if request.url.query:
+            url = f"{url}?{request.url.query}"
+        etag = data_versions.etag(tables, url)
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            raise HTTPException(status_code=304, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+        return etag
+
+    return check_etag
+
+
+# 行の版数から強い ETag を作る（PUT の If-Match で送り返してもらう）
+def version_etag(version: int) -> str:
+    return f'"{version}"'
+
+
+# 1件取得の応答に版数の ETag を付ける（If-None-Match が一致すれば 304）
+def set_version_etag(request: Request, response: Response, version: int):
+    etag = version_etag(version)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        raise HTTPException(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+
+
+# If-Match ヘッダーから更新を許す版数を取り出す（強い比較）
+# ヘッダーがなければ 428、"*" の場合は None（版数を照合しない）を返す
+def if_match_versions(if_match: Optional[str]) -> Optional[frozenset]:
+    if if_match is None:
+        raise HTTPException(status_code=428, detail="If-Match header is required")
+    if if_match.strip() == "*":
+        return None
+    versions = set()
+    for candidate in if_match.split(","):
+        candidate = candidate.strip()
+        if (
+            len(candidate) > 2
+            and candidate[0] == candidate[-1] == '"'
+            and candidate[1:-1].isdigit()
+        ):
+            versions.add(int(candidate[1:-1]))
+    return frozenset(versions)
@@ -0,0 +1,54 @@
+# export.py
+# 予約のエクスポート（NDJSON / CSV）を1バッチずつ文字列に変換する
+import csv
+import io
+import json
+from datetime import datetime
+
+# エクスポートする列（予約テーブルの列名と同じ）
+EXPORT_COLUMNS = (
+    "booking_id",
+    "user_id",
+    "main_user_id",
+    "room_id",
+    "start_datetime",
+    "end_datetime",
+    "series_id",
+    "version",
+)
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _plain(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+# 行のバッチを NDJSON（1行1 JSON オブジェクト）の文字列にする
+def ndjson_chunk(rows) -> str:
+    return "".join(
+        json.dumps(dict(zip(EXPORT_COLUMNS, map(_plain, row))), ensure_ascii=False)
+        + "\n"
+        for row in rows
+    )
+
+
+# 行のバッチを CSV の文字列にする（header=True のときは先頭にヘッダー行を付ける）
+def csv_chunk(rows, header: bool = False) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+    writer.writerows([[_plain(value) for value in row] for row in rows])
+    return buffer.getvalue()
+
+
+# サーバーサイドカーソルから届くバッチを順に文字列へ変換する
+async def stream_export(batches, export_format: str):
+    if export_format == "csv":
+        yield csv_chunk((), header=True)
+    async for rows in batches:
+        if export_format == "csv":
+            yield csv_chunk(rows)
+        else:
+            yield ndjson_chunk(rows)
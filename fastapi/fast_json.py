@@ -0,0 +1,20 @@
+# fast_json.py
+# 一覧APIの高速なレスポンス
+# Core の select で取得した行（dict）を Pydantic の検証を通さず orjson で直接 JSON にする
+# （OpenAPI のスキーマは各ルートの response_model のまま）
+from fastapi.responses import ORJSONResponse
+
+from pagination import set_next_cursor
+
+
+# 行のリストを JSON のレスポンスにする
+# key を渡すとページが埋まっているときに次ページのカーソルをヘッダーに付ける
+# headers には依存関係で設定したヘッダー（ETag など）を渡す
+# fields には全行に共通で付ける項目（値が常に null の項目など）を渡す
+def list_response(rows: list, limit: int = None, key=None, headers=None, **fields):
+    if fields:
+        rows = [{**row, **fields} for row in rows]
+    response = ORJSONResponse(rows, headers=dict(headers or {}))
+    if key is not None:
+        set_next_cursor(response, rows, limit, key)
+    return response
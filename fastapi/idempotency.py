@@ -0,0 +1,194 @@
+# idempotency.py
+import hashlib
+import itertools
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException, Response
+from pydantic import BaseModel
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+import models
+from session import AsyncSessionLocal
+from settings import settings
+
+# 応答を保存できなかった実行済みのリクエストの再送に返す内容
+UNSAVED_STATUS_CODE = 409
+UNSAVED_BODY = '{"detail":"A request with this Idempotency-Key was already processed"}'
+# 保存済みの応答を返したことを示すレスポンスヘッダー
+REPLAYED_HEADER = "Idempotent-Replayed"
+# キーの登録この回数ごとに、期限切れの行をまとめて削除する
+PURGE_EVERY = 100
+
+# request_hash に含めない項目（平文のパスワードを推測できるハッシュを保存しない）
+SECRET_FIELDS = {"password"}
+
+_reservations = itertools.count(1)
+
+
+# リクエストボディの SHA-256（同じキーで別の内容を送った場合の検出用）
+def request_hash(payload: BaseModel) -> str:
+    body = payload.model_dump_json(exclude=SECRET_FIELDS)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+# Idempotency-Key 付きの作成リクエストを1回だけ実行するためのガード
+#
+#   async with IdempotencyGuard(key, "POST /bookings/", booking) as guard:
+#       if guard.replay is not None:
+#           return guard.replay
+#       ...書き込み...
+#       await guard.save(schemas.Booking, new_booking)
+#
+# 入るときにキーを (endpoint, key) の一意インデックスで登録し（処理中）、
+# save で応答を保存する。同じキーの再送には保存済みの応答を返し、
+# 処理中の同時リクエストは 409 にする。書き込みが失敗した場合はキーを削除し、再送で実行し直せるようにする。
+# save を呼んだ時点で書き込みは commit 済みなので、応答の保存に失敗してもキーは削除せず、
+# 実行済み（409）として記録する（再送で同じ書き込みを繰り返さない）。
+# key が None の場合は何もしない。
+class IdempotencyGuard:
+    def __init__(
+        self,
+        key: str,
+        endpoint: str,
+        payload: BaseModel,
+        session_factory=AsyncSessionLocal,
+    ):
+        self.key = key
+        self.endpoint = endpoint
+        self.request_hash = request_hash(payload) if key is not None else None
+        self.replay = None
+        self._session_factory = session_factory
+        self._row_id = None
+        self._committed = False
+        self._saved = False
+
+    async def __aenter__(self):
+        if self.key is not None:
+            if not self.key or len(self.key) > 255:
+                raise HTTPException(status_code=400, detail="Invalid Idempotency-Key")
+            self.replay = await self._reserve()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self._row_id is not None and not self._saved:
+            if self._committed:
+                await self._store(UNSAVED_STATUS_CODE, UNSAVED_BODY)
+            else:
+                async with self._session_factory() as db:
+                    await db.execute(
+                        delete(models.IdempotencyKey).where(
+                            models.IdempotencyKey.idempotency_key_id == self._row_id
+                        )
+                    )
+                    await db.commit()
+        return False
+
+    # 書き込みの結果を response_model で JSON にして保存する
+    async def save(self, response_model, content, status_code: int = 200):
+        if self._row_id is None:
+            return
+        self._committed = True
+        body = response_model.model_validate(
+            content, from_attributes=True
+        ).model_dump_json()
+        await self._store(status_code, body)
+        self._saved = True
+
+    async def _store(self, status_code: int, body: str):
+        async with self._session_factory() as db:
+            await db.execute(
+                update(models.IdempotencyKey)
+                .where(models.IdempotencyKey.idempotency_key_id == self._row_id)
+                .values(status_code=status_code, response_body=body)
+            )
+            await db.commit()
+
+    # キーを登録する（登録済みなら保存済みの応答を返す）
+    async def _reserve(self):
+        now = datetime.utcnow()
+        expired_before = now - timedelta(seconds=settings.idempotency_ttl)
+        abandoned_before = now - timedelta(seconds=settings.idempotency_lock_timeout)
+        async with self._session_factory() as db:
+            for _ in range(3):
+                try:
+                    result = await db.execute(
+                        insert(models.IdempotencyKey).values(
+                            endpoint=self.endpoint,
+                            key=self.key,
+                            request_hash=self.request_hash,
+                            created_at=now,
+                        )
+                    )
+                    await db.commit()
+                    self._row_id = result.inserted_primary_key[0]
+                    if next(_reservations) % PURGE_EVERY == 0:
+                        await purge_expired(db, expired_before)
+                    return None
+                except IntegrityError:
+                    await db.rollback()
+
+                row = (
+                    await db.execute(
+                        select(
+                            models.IdempotencyKey.idempotency_key_id,
+                            models.IdempotencyKey.request_hash,
+                            models.IdempotencyKey.status_code,
+                            models.IdempotencyKey.response_body,
+                            models.IdempotencyKey.created_at,
+                        ).where(
+                            models.IdempotencyKey.endpoint == self.endpoint,
+                            models.IdempotencyKey.key == self.key,
+                        )
+                    )
+                ).first()
+                if row is None:
+                    # 確認の間に削除された場合は登録し直す
+                    continue
+                if row.created_at < expired_before:
+                    await purge_expired(db, expired_before)
+                    continue
+                if row.request_hash != self.request_hash:
+                    raise HTTPException(
+                        status_code=422,
+                        detail="Idempotency-Key was already used for a different request",
+                    )
+                if row.status_code is not None:
+                    return Response(
+                        content=row.response_body,
+                        status_code=row.status_code,
+                        media_type="application/json",
+                        headers={REPLAYED_HEADER: "true"},
+                    )
+                if row.created_at < abandoned_before:
+                    # 処理中のまま放置されたキー（ワーカーの停止など）を引き継ぐ
+                    result = await db.execute(
+                        update(models.IdempotencyKey)
+                        .where(
+                            models.IdempotencyKey.idempotency_key_id
+                            == row.idempotency_key_id,
+                            models.IdempotencyKey.status_code.is_(None),
+                            models.IdempotencyKey.created_at == row.created_at,
+                        )
+                        .values(created_at=now)
+                    )
+                    await db.commit()
+                    if result.rowcount == 1:
+                        self._row_id = row.idempotency_key_id
+                        return None
+                break
+        raise HTTPException(
+            status_code=409,
+            detail="A request with this Idempotency-Key is in progress",
+            headers={"Retry-After": "1"},
+        )
+
+
+# 期限切れのキーを削除する（created_at のインデックスで範囲削除）
+async def purge_expired(db, expired_before: datetime):
+    await db.execute(
+        delete(models.IdempotencyKey).where(
+            models.IdempotencyKey.created_at < expired_before
+        )
+    )
+    await db.commit()
@@ -1,18 +1,44 @@
 # main.py
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import (
+    FastAPI,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
 from sqlalchemy.orm import Session
-from crud import authenticate_user, get_user
-import crud, models, schemas
-from database import engine
-from session import SessionLocal
+from sqlalchemy.ext.asyncio import AsyncSession
+import crud, crud_async, models, schemas
+from database import engine, async_engine, pool_stats
+from session import SessionLocal, AsyncSessionLocal
+from pagination import NEXT_CURSOR_HEADER, set_next_cursor
+from auth_cache import token_cache
+from room_cache import room_catalog
+from occupancy import build_occupancy_grid, day_range, encode_rows
+from analytics import (
+    build_utilization_groups,
+    spread_utilization_rows,
+    utilization_cache,
+)
+from export import MEDIA_TYPES, stream_export
+from user_import import import_report, parse_user_rows, validate_user_rows
+from fast_json import list_response
+from etag import conditional_get, if_match_versions, set_version_etag, version_etag
+from idempotency import REPLAYED_HEADER, IdempotencyGuard
+from broadcast import Subscription, booking_broadcaster, booking_snapshot, format_sse
 from fastapi.middleware.cors import CORSMiddleware
-from datetime import datetime, timedelta
+from fastapi.responses import StreamingResponse
+from datetime import date, datetime, timedelta
 from typing import Optional
 from pydantic import BaseModel, Field
 from fastapi.security import OAuth2PasswordBearer
 from passlib.context import CryptContext
 import jwt
 from jwt import PyJWTError
+import asyncio
 import logging
 
 # JWTトークンの設定
@@ -20,6 +46,10 @@ SECRET_KEY = "your_secret_key"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# 予約の変更通知（SSE）のキープアライブ間隔と、クライアントの再接続までの待ち時間
+SSE_KEEPALIVE_SECONDS = 15
+SSE_RETRY_MILLISECONDS = 3000
+
 # パスワードハッシュの設定
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -63,6 +93,21 @@ async def health_check():
     return {"status": "ok"}
 
 
+# 認証キャッシュのヒット数・ミス数
+@app.get("/health/auth_cache")
+async def auth_cache_health_check():
+    return token_cache.stats()
+
+
+# コネクションプールの状態（ワーカー数やプールサイズの調整用）
+@app.get("/health/pool")
+async def pool_health_check():
+    return {
+        "sync": pool_stats(engine.pool),
+        "async": pool_stats(async_engine.sync_engine.pool),
+    }
+
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -73,9 +118,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag", REPLAYED_HEADER],
 )
 
 
+# 参照系のレスポンスが依存するテーブル（ETag の版数に使う）
+USER_TABLES = ("users",)
+ROOM_TABLES = ("rooms",)
+GUEST_USER_TABLES = ("guest_users",)
+OCCUPANCY_TABLES = ("bookings", "rooms")
+BOOKING_TABLES = ("bookings", "rooms", "users", "guest_users")
+
+
 # 依存関係
 def get_db():
     db = SessionLocal()
@@ -85,24 +139,37 @@ def get_db():
         db.close()
 
 
+# 非同期用の依存関係
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 # JWTトークンの検証
+# 検証済みのトークンはキャッシュし、同じセッションからの再検証と DB 参照を省く
 async def get_current_user(
-    token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
+    token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)
 ):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    cached_user = token_cache.get(token)
+    if cached_user is not None:
+        return cached_user
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: str = payload.get("user_id")
         if user_id is None:
             raise credentials_exception
-        user = get_user(db, user_id=user_id)
+        user = await crud_async.get_user(db, user_id=user_id)
         if user is None:
             raise credentials_exception
-        return user
+        current_user = schemas.User.model_validate(user, from_attributes=True)
+        if "exp" in payload:
+            token_cache.put(token, current_user, payload["exp"])
+        return current_user
     except PyJWTError:
         raise credentials_exception
 
@@ -115,9 +182,11 @@ class LoginRequest(BaseModel):
 
 @app.post("/token")
 async def login_for_access_token(
-    request_data: LoginRequest, db: Session = Depends(get_db)
+    request_data: LoginRequest, db: AsyncSession = Depends(get_async_db)
 ):
-    user = authenticate_user(db, request_data.employee_number, request_data.password)
+    user = await crud_async.authenticate_user(
+        db, request_data.employee_number, request_data.password
+    )
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -133,23 +202,82 @@ async def login_for_access_token(
 
 
 # ユーザー関連のAPI
-@app.get("/users/", response_model=list[schemas.User])
-def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    users = crud.get_users(db, skip=skip, limit=limit)
-    return users
+@app.get(
+    "/users/",
+    response_model=list[schemas.User],
+    dependencies=[Depends(conditional_get(*USER_TABLES))],
+)
+def read_users(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    users = crud.get_user_rows(db, skip=skip, limit=limit, cursor=cursor)
+    return list_response(
+        users, limit, lambda user: [user["user_id"]], headers=response.headers
+    )
 
 
-@app.get("/users/{user_id}", response_model=schemas.User)
-def read_user(user_id: int, db: Session = Depends(get_db)):
-    user = crud.get_user(db, user_id=user_id)
+@app.get(
+    "/users/{user_id}",
+    response_model=schemas.User,
+    dependencies=[Depends(conditional_get(*USER_TABLES))],
+)
+async def read_user(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    user = await crud_async.get_user(db, user_id=user_id)
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
 
 @app.post("/users/", response_model=schemas.User)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    return crud.create_user(db=db, user=user)
+async def create_user(
+    user: schemas.UserCreate,
+    db: AsyncSession = Depends(get_async_db),
+    idempotency_key: Optional[str] = Header(None),
+):
+    async with IdempotencyGuard(idempotency_key, "POST /users/", user) as guard:
+        if guard.replay is not None:
+            return guard.replay
+        db_user = await crud_async.create_user(db=db, user=user)
+        await guard.save(schemas.User, db_user)
+    return db_user
+
+
+# ユーザーの一括登録（Content-Type: text/csv の CSV、または JSON の配列）
+# 登録できなかった行があっても他の行は登録し、1行ごとの結果を返す
+@app.post("/users/bulk", response_model=schemas.UserImportReport)
+async def create_users_bulk(request: Request, db: AsyncSession = Depends(get_async_db)):
+    rows = parse_user_rows(
+        await request.body(), request.headers.get("content-type", "")
+    )
+    users, errors = validate_user_rows(rows)
+    created_ids, duplicate_errors = await crud_async.create_users_bulk(db, users)
+    errors.update(duplicate_errors)
+    return import_report(rows, created_ids, errors)
+
+
+# 社員番号の一括解決
+@app.post("/users/resolve", response_model=schemas.UserResolveResponse)
+async def resolve_users(
+    request_data: schemas.UserResolveRequest,
+    db: AsyncSession = Depends(get_async_db),
+):
+    employee_numbers = list(dict.fromkeys(request_data.employee_numbers))
+    users = await crud_async.get_users_by_employee_numbers(db, employee_numbers)
+    users_by_number = {user.employee_number: user for user in users}
+    return {
+        "users": [
+            users_by_number[number]
+            for number in employee_numbers
+            if number in users_by_number
+        ],
+        "unknown_employee_numbers": [
+            number for number in employee_numbers if number not in users_by_number
+        ],
+    }
 
 
 @app.delete("/users/{user_id}")
@@ -161,23 +289,47 @@ def delete_user(user_id: int, db: Session = Depends(get_db)):
 
 
 @app.put("/users/{user_id}", response_model=schemas.User)
-def update_user(user_id: int, user: schemas.UserUpdate, db: Session = Depends(get_db)):
-    updated_user = crud.update_user(db=db, user_id=user_id, updated_user=user)
+async def update_user(
+    user_id: int, user: schemas.UserUpdate, db: AsyncSession = Depends(get_async_db)
+):
+    updated_user = await crud_async.update_user(
+        db=db, user_id=user_id, updated_user=user
+    )
     if updated_user is None:
         raise HTTPException(status_code=404, detail="User not found")
     return updated_user
 
 
 # 会議室関連のAPI
-@app.get("/rooms/", response_model=list[schemas.Room])
-def read_rooms(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    rooms = crud.get_rooms(db, skip=skip, limit=limit)
+@app.get(
+    "/rooms/",
+    response_model=list[schemas.Room],
+    dependencies=[Depends(conditional_get(*ROOM_TABLES))],
+)
+def read_rooms(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    rooms = crud.get_rooms(db, skip=skip, limit=limit, cursor=cursor)
+    set_next_cursor(response, rooms, limit, lambda room: [room.room_id])
     return rooms
 
 
 @app.post("/rooms/", response_model=schemas.Room)
-def create_room(room: schemas.RoomCreate, db: Session = Depends(get_db)):
-    return crud.create_room(db=db, room=room)
+async def create_room(
+    room: schemas.RoomCreate,
+    db: AsyncSession = Depends(get_async_db),
+    idempotency_key: Optional[str] = Header(None),
+):
+    async with IdempotencyGuard(idempotency_key, "POST /rooms/", room) as guard:
+        if guard.replay is not None:
+            return guard.replay
+        db_room = await crud_async.create_room(db=db, room=room)
+        await guard.save(schemas.Room, db_room)
+    return db_room
 
 
 @app.delete("/rooms/{room_id}")
@@ -188,63 +340,338 @@ def delete_room(room_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Room not found")
 
 
+# 更新には GET で受け取った ETag を If-Match に付ける（他の更新と競合した場合は 412）
 @app.put("/rooms/{room_id}", response_model=schemas.Room)
-def update_room(room_id: int, room: schemas.RoomUpdate, db: Session = Depends(get_db)):
-    updated_room = crud.update_room(db=db, room_id=room_id, updated_room=room)
+def update_room(
+    room_id: int,
+    room: schemas.RoomUpdate,
+    response: Response,
+    db: Session = Depends(get_db),
+    if_match: Optional[str] = Header(None),
+):
+    updated_room = crud.update_room(
+        db=db,
+        room_id=room_id,
+        updated_room=room,
+        expected_versions=if_match_versions(if_match),
+    )
     if updated_room is None:
         raise HTTPException(status_code=404, detail="Room not found")
+    response.headers["ETag"] = version_etag(updated_room.version)
     return updated_room
 
 
+# /rooms/{room_id} より先に定義する
+@app.get(
+    "/rooms/executive",
+    response_model=list[schemas.Room],
+    dependencies=[Depends(conditional_get(*ROOM_TABLES))],
+)
+def read_executive_rooms(
+    skip: int = 0, limit: int = 100, db: Session = Depends(get_db)
+):
+    executive_rooms = crud.get_executive_rooms(db, skip=skip, limit=limit)
+    return executive_rooms
+
+
+# 空き会議室の検索
+# gaps を指定した場合は、条件に合う全会議室について start 以降の空き時間帯
+# （end - start 以上の長さ）を horizon_hours 以内で最大 gaps 件返す
+@app.get(
+    "/rooms/available",
+    response_model=list[schemas.AvailableRoom],
+    dependencies=[Depends(conditional_get(*OCCUPANCY_TABLES))],
+)
+async def read_available_rooms(
+    start: datetime,
+    end: datetime,
+    min_capacity: Optional[int] = None,
+    executive: Optional[bool] = None,
+    gaps: int = Query(0, ge=0, le=50),
+    horizon_hours: int = Query(24, ge=1, le=24 * 31),
+    db: AsyncSession = Depends(get_async_db),
+):
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+
+    if gaps == 0:
+        rooms = await crud_async.get_available_rooms(
+            db, start, end, min_capacity=min_capacity, executive=executive
+        )
+        return [
+            schemas.AvailableRoom.model_validate(room, from_attributes=True)
+            for room in rooms
+        ]
+
+    rooms = await crud_async.get_rooms_by_condition(
+        db, min_capacity=min_capacity, executive=executive
+    )
+    free_slots = await crud_async.get_free_slots(
+        db,
+        [room.room_id for room in rooms],
+        start,
+        end - start,
+        gaps,
+        start + timedelta(hours=horizon_hours),
+    )
+    available_rooms = []
+    for room in rooms:
+        slots = free_slots[room.room_id]
+        if not slots:
+            continue
+        available_room = schemas.AvailableRoom.model_validate(
+            room, from_attributes=True
+        )
+        available_room.free_slots = [
+            schemas.TimeSlot(start_datetime=slot_start, end_datetime=slot_end)
+            for slot_start, slot_end in slots
+        ]
+        available_rooms.append(available_room)
+    return available_rooms
+
+
+# ETag は会議室の版数（PUT の If-Match に使う）
+# 版数もキャッシュから返す（他のワーカーでの更新で古くなった版数は、PUT の If-Match が 412 にする）
 @app.get("/rooms/{room_id}", response_model=schemas.Room)
-def read_room(room_id: int, db: Session = Depends(get_db)):
-    room = crud.get_room_by_id(db, room_id=room_id)
+async def read_room(
+    room_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+):
+    room = await crud_async.get_room_by_id(db, room_id=room_id)
     if room is None:
         raise HTTPException(status_code=404, detail="Room not found")
+    set_version_etag(request, response, room.version)
     return room
 
 
 # 予約関連のAPI
-@app.get("/bookings/", response_model=list[schemas.Booking])
-def read_bookings(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    bookings = crud.get_booking(db, skip=skip, limit=limit)
-    return bookings
-
-
-@app.post("/bookings/", response_model=schemas.Booking)
-def create_booking(booking: schemas.BookingCreate, db: Session = Depends(get_db)):
-    # 予約の作成と代表者の確認
-    new_booking = crud.create_booking(db=db, booking=booking)
-
-    # 追加メンバー（社員）の登録
-    for employee_number in booking.member_employee_numbers:
-        user = (
-            db.query(models.User)
-            .filter(models.User.employee_number == employee_number)
-            .first()
+# room_id / user_id / 開始日時の範囲（start_from 以上 start_to 未満）/ 役員用会議室で絞り込み、
+# sort=desc で新しい順に返す（カーソルは同じ絞り込み・並び順のまま渡す）
+# include=room,main_user,members,guests（participants で参加者3種）を指定すると
+# ページ内の予約分をリレーションごとに1クエリでまとめて読み込んで返す
+@app.get(
+    "/bookings/",
+    response_model=list[schemas.BookingDetail],
+    dependencies=[Depends(conditional_get(*BOOKING_TABLES))],
+)
+async def read_bookings(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    include: Optional[str] = None,
+    room_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    start_from: Optional[datetime] = None,
+    start_to: Optional[datetime] = None,
+    executive_only: bool = False,
+    sort: str = Query("asc", pattern="^(asc|desc)$"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    relations = crud_async.parse_booking_include(include)
+    filters = dict(
+        room_id=room_id,
+        user_id=user_id,
+        start_from=start_from,
+        start_to=start_to,
+        executive_only=executive_only,
+    )
+    if not relations:
+        # リレーションが不要な場合は Core の行をそのまま orjson で返す
+        rows = await crud_async.get_booking_rows(
+            db,
+            skip=skip,
+            limit=limit,
+            cursor=cursor,
+            descending=sort == "desc",
+            **filters,
         )
-    if user:
-        booking_user = models.BookingUsers(
-            booking_id=new_booking.booking_id, user_id=user.user_id
+        return list_response(
+            rows,
+            limit,
+            lambda row: [row["start_datetime"], row["booking_id"]],
+            headers=response.headers,
+            **dict.fromkeys(crud_async.BOOKING_RELATIONS),
         )
-        db.add(booking_user)
-    # ゲストの登録
-    for guest_name in booking.guest_names:
-        crud.create_guest_user(
-            db=db,
-            guest_user=schemas.GuestUserCreate(
-                name=guest_name, booking_id=new_booking.booking_id
-            ),
+
+    bookings = await crud_async.get_booking(
+        db,
+        skip=skip,
+        limit=limit,
+        cursor=cursor,
+        include=relations,
+        descending=sort == "desc",
+        **filters,
+    )
+    set_next_cursor(
+        response,
+        bookings,
+        limit,
+        lambda booking: [booking.start_datetime, booking.booking_id],
+    )
+    return [
+        {
+            **schemas.Booking.model_validate(
+                booking, from_attributes=True
+            ).model_dump(),
+            "main_user_id": booking.main_user_id,
+            **{name: getattr(booking, name) for name in relations},
+        }
+        for booking in bookings
+    ]
+
+
+# 予約のエクスポート（開始日時が from 以上 to 未満の予約を NDJSON / CSV で順次送る）
+# 件数が多くてもメモリに溜めないよう、専用のセッションでサーバーサイドカーソルから読む
+@app.get("/bookings/export")
+async def export_bookings(
+    export_format: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    start_from: Optional[datetime] = Query(None, alias="from"),
+    start_to: Optional[datetime] = Query(None, alias="to"),
+):
+    async def body():
+        async with AsyncSessionLocal() as db:
+            batches = crud_async.stream_booking_rows(db, start_from, start_to)
+            async for chunk in stream_export(batches, export_format):
+                yield chunk
+
+    return StreamingResponse(
+        body(),
+        media_type=MEDIA_TYPES[export_format],
+        headers={
+            "Content-Disposition": f'attachment; filename="bookings.{export_format}"'
+        },
+    )
+
+
+# 予約の変更（created / updated / deleted）を Server-Sent Events で配信する
+# room_id と date（utc_offset_minutes の時差での1日）で絞り込み、
+# 再接続時は Last-Event-ID より後のイベントを再送する
+@app.get("/bookings/stream")
+async def stream_bookings(
+    room_id: Optional[int] = None,
+    target_date: Optional[date] = Query(None, alias="date"),
+    utc_offset_minutes: int = Query(0, ge=-720, le=840),
+    last_event_id: Optional[int] = Header(None),
+):
+    window_start = window_end = None
+    if target_date is not None:
+        window_start, window_end, _ = day_range(target_date, 60, utc_offset_minutes)
+
+    async def events():
+        subscription = booking_broadcaster.subscribe(
+            Subscription(room_id, window_start, window_end), last_event_id
         )
+        try:
+            yield f"retry: {SSE_RETRY_MILLISECONDS}\n\n"
+            replay, subscription.replay = subscription.replay, []
+            for event in replay:
+                yield format_sse(event)
+            while True:
+                try:
+                    event = await asyncio.wait_for(
+                        subscription.queue.get(), SSE_KEEPALIVE_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    # プロキシに切断されないよう定期的にコメント行を送る
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is None:
+                    break
+                yield format_sse(event)
+        finally:
+            booking_broadcaster.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# 予約の詳細（会議室・代表者・メンバー・ゲストを固定回数のクエリで取得する）
+@app.get(
+    "/bookings/{booking_id}/detail",
+    response_model=schemas.BookingDetail,
+    dependencies=[Depends(conditional_get(*BOOKING_TABLES))],
+)
+async def read_booking_detail(
+    booking_id: int, db: AsyncSession = Depends(get_async_db)
+):
+    booking = await crud_async.get_booking_detail(db, booking_id)
+    if booking is None:
+        raise HTTPException(status_code=404, detail="Booking not found")
+    return booking
+
+
+# 予約を1件取得する（ETag は予約の版数で、PUT の If-Match に使う）
+@app.get("/bookings/{booking_id}", response_model=schemas.Booking)
+async def read_booking(
+    booking_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+):
+    booking = await crud_async.get_booking_by_id(db, booking_id)
+    if booking is None:
+        raise HTTPException(status_code=404, detail="Booking not found")
+    set_version_etag(request, response, booking.version)
+    return booking
+
 
+@app.post("/bookings/", response_model=schemas.Booking)
+# Idempotency-Key を付けた再送では予約を作り直さず、最初の応答を返す
+async def create_booking(
+    booking: schemas.BookingCreate,
+    db: AsyncSession = Depends(get_async_db),
+    idempotency_key: Optional[str] = Header(None),
+):
+    async with IdempotencyGuard(idempotency_key, "POST /bookings/", booking) as guard:
+        if guard.replay is not None:
+            return guard.replay
+        # 予約・追加メンバー・ゲストの登録を1トランザクションで行う
+        new_booking = await crud_async.create_booking_with_members(
+            db=db, booking_data=booking
+        )
+        await guard.save(schemas.Booking, new_booking)
+    booking_broadcaster.publish("created", new_booking)
     return new_booking
 
 
+# 定期予約の一括登録（重複した回は登録せず conflicts で返す）
+@app.post("/booking_series/", response_model=schemas.BookingSeriesResult)
+async def create_booking_series(
+    series: schemas.BookingSeriesCreate,
+    db: AsyncSession = Depends(get_async_db),
+    idempotency_key: Optional[str] = Header(None),
+):
+    async with IdempotencyGuard(
+        idempotency_key, "POST /booking_series/", series
+    ) as guard:
+        if guard.replay is not None:
+            return guard.replay
+        db_series, bookings, conflicts = await crud_async.create_booking_series(
+            db=db, series=series
+        )
+        result = {
+            "series_id": db_series.series_id,
+            "bookings": bookings,
+            "conflicts": [
+                {"start_datetime": start, "end_datetime": end}
+                for start, end in conflicts
+            ],
+        }
+        await guard.save(schemas.BookingSeriesResult, result)
+    for new_booking in bookings:
+        booking_broadcaster.publish("created", new_booking)
+    return result
+
+
 @app.delete("/bookings/{booking_id}")
-def delete_booking(booking_id: int, db: Session = Depends(get_db)):
-    db_booking = (
-        db.query(models.Booking).filter(models.Booking.booking_id == booking_id).first()
-    )
+async def delete_booking(booking_id: int, db: AsyncSession = Depends(get_async_db)):
+    db_booking = await crud_async.get_booking_by_id(db, booking_id)
 
     if db_booking is None:
         raise HTTPException(status_code=404, detail="Booking not found")
@@ -259,36 +686,161 @@ def delete_booking(booking_id: int, db: Session = Depends(get_db)):
             detail="開始30分切っているためキャンセルできません",
         )
 
-    if crud.delete_booking(db=db, booking_id=booking_id):
+    deleted_booking = booking_snapshot(db_booking)
+    if await crud_async.delete_booking(db=db, booking_id=booking_id):
+        booking_broadcaster.publish("deleted", deleted_booking)
         return {"message": "Booking deleted"}
     else:
         raise HTTPException(status_code=404, detail="Booking not found")
 
 
+# 更新には GET で受け取った ETag を If-Match に付ける（他の更新と競合した場合は 412）
 @app.put("/bookings/{booking_id}", response_model=schemas.Booking)
-def update_booking(
-    booking_id: int, booking: schemas.BookingUpdate, db: Session = Depends(get_db)
+async def update_booking(
+    booking_id: int,
+    booking: schemas.BookingUpdate,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    if_match: Optional[str] = Header(None),
 ):
-    updated_booking = crud.update_booking(
-        db=db, booking_id=booking_id, updated_booking=booking
+    expected_versions = if_match_versions(if_match)
+    # 変更先の会議室のロックを先に取り、変更前の内容もロックの中で読む
+    await crud_async.lock_room(db, booking.room_id)
+    # 変更前の内容（同じセッションで読むため update_booking での取得は追加のクエリにならない）
+    db_booking = await crud_async.get_booking_by_id(db, booking_id)
+    previous = booking_snapshot(db_booking) if db_booking is not None else None
+    updated_booking = await crud_async.update_booking(
+        db=db,
+        booking_id=booking_id,
+        updated_booking=booking,
+        expected_versions=expected_versions,
     )
     if updated_booking is None:
         raise HTTPException(status_code=404, detail="Booking not found")
+    booking_broadcaster.publish("updated", updated_booking, previous)
+    response.headers["ETag"] = version_etag(updated_booking.version)
     return updated_booking
 
 
+# フロア全体の会議室 × 時間枠の使用状況
+# utc_offset_minutes を指定すると、その時差での1日（例: 日本時間は 540）を対象にする
+@app.get(
+    "/occupancy",
+    response_model=schemas.OccupancyGrid,
+    dependencies=[Depends(conditional_get(*OCCUPANCY_TABLES))],
+)
+async def read_occupancy(
+    date: date,
+    slot_minutes: int = Query(15, ge=5, le=240),
+    utc_offset_minutes: int = Query(0, ge=-720, le=840),
+    executive: Optional[bool] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    if (24 * 60) % slot_minutes:
+        raise HTTPException(
+            status_code=400, detail="slot_minutes must divide a day evenly"
+        )
+    day_start, day_end, slot_count = day_range(date, slot_minutes, utc_offset_minutes)
+    rooms = await room_catalog.rooms_async(db)
+    if executive is not None:
+        rooms = [room for room in rooms if room.executive == executive]
+    rows = await crud_async.get_booking_ranges(db, day_start, day_end)
+    grid = build_occupancy_grid(
+        [room.room_id for room in rooms], rows, day_start, slot_minutes, slot_count
+    )
+    return {
+        "date": date,
+        "start_datetime": day_start,
+        "slot_minutes": slot_minutes,
+        "slot_count": slot_count,
+        "rooms": [
+            {"room_id": room.room_id, "room_name": room.room_name, "occupancy": row}
+            for room, row in zip(rooms, encode_rows(grid))
+        ],
+    }
+
+
+# 会議室の稼働率の集計（from / to の日付を含む期間）
+# 終了済みの期間の結果は ETag（会議室・予約の版数とクエリ）ごとにキャッシュする
+# 過去の予約の変更・削除や会議室の追加・削除があれば ETag が変わり、古い結果は使われない
+@app.get("/analytics/utilization", response_model=schemas.UtilizationReport)
+async def read_utilization(
+    from_date: date = Query(..., alias="from"),
+    to_date: date = Query(..., alias="to"),
+    group_by: str = Query("room", pattern="^(room|day|hour)$"),
+    utc_offset_minutes: int = Query(0, ge=-720, le=840),
+    db: AsyncSession = Depends(get_async_db),
+    etag: str = Depends(conditional_get(*OCCUPANCY_TABLES)),
+):
+    if to_date < from_date:
+        raise HTTPException(status_code=400, detail="from must not be after to")
+    window_start, _, _ = day_range(from_date, 60, utc_offset_minutes)
+    _, window_end, _ = day_range(to_date, 60, utc_offset_minutes)
+    closed = window_end <= datetime.utcnow()
+    if closed:
+        cached_report = utilization_cache.get(etag)
+        if cached_report is not None:
+            return cached_report
+
+    rooms = await room_catalog.rooms_async(db)
+    # 会議室ごとの集計とピークの時間帯は、会議室・時間ごとの同じ集計行から求める
+    bucket_rows = await crud_async.get_utilization_buckets(
+        db, window_start, window_end, group_by, utc_offset_minutes
+    )
+    rows = spread_utilization_rows(bucket_rows, group_by, from_date)
+    peak_rows = ()
+    if group_by == "room":
+        peak_rows = spread_utilization_rows(bucket_rows, "room_hour", from_date)
+    report = {
+        "from_date": from_date,
+        "to_date": to_date,
+        "group_by": group_by,
+        "room_count": len(rooms),
+        "groups": build_utilization_groups(
+            group_by, rows, rooms, (to_date - from_date).days + 1, peak_rows
+        ),
+    }
+    if closed:
+        utilization_cache.put(etag, report)
+    return report
+
+
 # ゲストユーザー関連のAPI
-@app.get("/guest_users/", response_model=list[schemas.GuestUser])
-def read_guest_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    guest_users = crud.get_guest_users(db, skip=skip, limit=limit)
-    return guest_users
+@app.get(
+    "/guest_users/",
+    response_model=list[schemas.GuestUser],
+    dependencies=[Depends(conditional_get(*GUEST_USER_TABLES))],
+)
+def read_guest_users(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    guest_users = crud.get_guest_user_rows(db, skip=skip, limit=limit, cursor=cursor)
+    return list_response(
+        guest_users,
+        limit,
+        lambda guest_user: [guest_user["guest_user_id"]],
+        headers=response.headers,
+    )
 
 
 @app.post("/guest_users/", response_model=schemas.GuestUser)
-def create_guest_user(
-    guest_user: schemas.GuestUserCreate, db: Session = Depends(get_db)
+async def create_guest_user(
+    guest_user: schemas.GuestUserCreate,
+    db: AsyncSession = Depends(get_async_db),
+    idempotency_key: Optional[str] = Header(None),
 ):
-    return crud.create_guest_user(db=db, guest_user=guest_user)
+    async with IdempotencyGuard(
+        idempotency_key, "POST /guest_users/", guest_user
+    ) as guard:
+        if guard.replay is not None:
+            return guard.replay
+        db_guest_user = await crud_async.create_guest_user(db=db, guest_user=guest_user)
+        await guard.save(schemas.GuestUser, db_guest_user)
+    return db_guest_user
 
 
 @app.delete("/guest_users/{guest_user_id}")
@@ -313,26 +865,39 @@ def update_guest_user(
     return updated_guest_user
 
 
-@app.get("/rooms/executive", response_model=list[schemas.Room])
-def read_executive_rooms(
-    skip: int = 0, limit: int = 100, db: Session = Depends(get_db)
-):
-    executive_rooms = crud.get_executive_rooms(db, skip=skip, limit=limit)
-    return executive_rooms
-
-
 @app.post("/rooms/executive", response_model=schemas.Room)
-def create_executive_room(room: schemas.RoomCreate, db: Session = Depends(get_db)):
-    return crud.create_executive_room(db=db, room=room)
+async def create_executive_room(
+    room: schemas.RoomCreate,
+    db: AsyncSession = Depends(get_async_db),
+    idempotency_key: Optional[str] = Header(None),
+):
+    async with IdempotencyGuard(
+        idempotency_key, "POST /rooms/executive", room
+    ) as guard:
+        if guard.replay is not None:
+            return guard.replay
+        db_room = await crud_async.create_room(db=db, room=room, executive=True)
+        await guard.save(schemas.Room, db_room)
+    return db_room
 
 
 @app.put("/rooms/executive/{room_id}", response_model=schemas.Room)
 def update_executive_room(
-    room_id: int, room: schemas.RoomUpdate, db: Session = Depends(get_db)
+    room_id: int,
+    room: schemas.RoomUpdate,
+    response: Response,
+    db: Session = Depends(get_db),
+    if_match: Optional[str] = Header(None),
 ):
-    updated_room = crud.update_executive_room(db=db, room_id=room_id, updated_room=room)
+    updated_room = crud.update_executive_room(
+        db=db,
+        room_id=room_id,
+        updated_room=room,
+        expected_versions=if_match_versions(if_match),
+    )
     if updated_room is None:
         raise HTTPException(status_code=404, detail="Room not found")
+    response.headers["ETag"] = version_etag(updated_room.version)
     return updated_room
 
 
@@ -349,13 +914,15 @@ def read_guest_page():
     return {"message": "Welcome to the guest page!"}
 
 
-@app.get("/users/employee_number/{employee_number}", response_model=schemas.User)
-def read_user_by_employee_number(employee_number: str, db: Session = Depends(get_db)):
-    user = (
-        db.query(models.User)
-        .filter(models.User.employee_number == employee_number)
-        .first()
-    )
+@app.get(
+    "/users/employee_number/{employee_number}",
+    response_model=schemas.User,
+    dependencies=[Depends(conditional_get(*USER_TABLES))],
+)
+async def read_user_by_employee_number(
+    employee_number: str, db: AsyncSession = Depends(get_async_db)
+):
+    user = await crud_async.get_user_by_employee_number(db, employee_number)
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
     return user
@@ -1,6 +1,15 @@
 # models.py
-from sqlalchemy import Column, ForeignKey, Integer, String, DateTime, Boolean
-from sqlalchemy.orm import Session
+from sqlalchemy import (
+    Column,
+    ForeignKey,
+    Integer,
+    String,
+    DateTime,
+    Boolean,
+    Index,
+    Text,
+)
+from sqlalchemy.orm import Session, relationship
 from sqlalchemy.ext.declarative import declarative_base
 import models as models
 
@@ -24,12 +33,16 @@ class Room(Base):
     capacity = Column(Integer)
     photo_url = Column(String(255))  # 新しいカラム
     executive = Column(Boolean, default=False)  # 新しいカラム
+    # 楽観的排他制御の版数（更新のたびに ORM が加算し、UPDATE の WHERE で照合する）
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+
+    __mapper_args__ = {"version_id_col": version}
 
 
 class Booking(Base):
     __tablename__ = "bookings"
     booking_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    user_id = Column(Integer, index=True)
+    user_id = Column(Integer)
     main_user_id = Column(
         Integer, ForeignKey("users.user_id", ondelete="SET NULL"), nullable=True
     )
@@ -38,6 +51,67 @@ class Booking(Base):
     )
     start_datetime = Column(DateTime, nullable=False)
     end_datetime = Column(DateTime, nullable=False)
+    series_id = Column(
+        Integer,
+        ForeignKey("booking_series.series_id", ondelete="SET NULL"),
+        nullable=True,
+        index=True,
+    )  # 定期予約から作成された場合のシリーズID
+    # 楽観的排他制御の版数（更新のたびに ORM が加算し、UPDATE の WHERE で照合する）
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+
+    # 参照専用のリレーション（読み込みは selectinload などで明示する）
+    room = relationship("Room", viewonly=True, lazy="raise")
+    main_user = relationship(
+        "User", foreign_keys=[main_user_id], viewonly=True, lazy="raise"
+    )
+    members = relationship(
+        "User",
+        secondary="booking_users",
+        order_by="User.user_id",
+        viewonly=True,
+        lazy="raise",
+    )
+    guests = relationship(
+        "GuestUser",
+        order_by="GuestUser.guest_user_id",
+        viewonly=True,
+        lazy="raise",
+    )
+
+    # 重複予約チェック用の複合インデックス
+    __table_args__ = (
+        Index(
+            "ix_bookings_room_id_start_end", "room_id", "start_datetime", "end_datetime"
+        ),
+        # キーセットページング用のインデックス
+        # 稼働率の集計で表を読まずに済むよう end_datetime と room_id も含める
+        Index(
+            "ix_bookings_start_id_end_room",
+            "start_datetime",
+            "booking_id",
+            "end_datetime",
+            "room_id",
+        ),
+        # ユーザーごとの期間指定の一覧用のインデックス（user_id 単独の検索も兼ねる）
+        Index("ix_bookings_user_id_start", "user_id", "start_datetime"),
+    )
+    __mapper_args__ = {"version_id_col": version}
+
+
+class BookingSeries(Base):
+    __tablename__ = "booking_series"
+    series_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    user_id = Column(Integer, index=True)
+    room_id = Column(
+        Integer, ForeignKey("rooms.room_id", ondelete="SET NULL"), nullable=True
+    )
+    freq = Column(String(10), nullable=False)  # DAILY または WEEKLY
+    interval = Column(Integer, nullable=False, default=1)
+    count = Column(Integer, nullable=True)
+    until = Column(DateTime, nullable=True)
+    start_datetime = Column(DateTime, nullable=False)  # 初回の開始日時
+    end_datetime = Column(DateTime, nullable=False)  # 初回の終了日時
 
 
 class BookingUsers(Base):
@@ -56,3 +130,20 @@ class GuestUser(Base):
     guest_user_id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255))
     booking_id = Column(Integer, ForeignKey("bookings.booking_id"), nullable=True)
+
+
+# 作成系APIの Idempotency-Key と、その応答
+# (endpoint, key) の一意インデックスで同じキーの同時リクエストを1つに絞る
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    idempotency_key_id = Column(Integer, primary_key=True, autoincrement=True)
+    endpoint = Column(String(100), nullable=False)
+    key = Column(String(255), nullable=False)
+    request_hash = Column(String(64), nullable=False)  # リクエストボディの SHA-256
+    status_code = Column(Integer, nullable=True)  # NULL の間は処理中
+    response_body = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False, index=True)
+
+    __table_args__ = (
+        Index("ux_idempotency_keys_endpoint_key", "endpoint", "key", unique=True),
+    )
@@ -0,0 +1,57 @@
+# occupancy.py
+import base64
+from datetime import datetime, timedelta
+
+import numpy as np
+
+
+# 会議室 × 時間枠の使用状況（True = 予約あり）を作る
+# 予約ごとの開始枠に +1、終了枠に -1 を加えて累積和を取ることで、
+# Python のループを使わずにまとめて埋める。
+def build_occupancy_grid(
+    room_ids: list,
+    rows: list,
+    day_start: datetime,
+    slot_minutes: int,
+    slot_count: int,
+) -> np.ndarray:
+    grid = np.zeros((len(room_ids), slot_count + 1), dtype=np.int32)
+    if room_ids and rows:
+        room_index = {room_id: index for index, room_id in enumerate(room_ids)}
+        rows = [row for row in rows if row.room_id in room_index]
+        room_rows = np.fromiter(
+            (room_index[row.room_id] for row in rows), dtype=np.intp, count=len(rows)
+        )
+        base = np.datetime64(day_start, "s")
+        starts = np.array([row.start_datetime for row in rows], dtype="datetime64[s]")
+        ends = np.array([row.end_datetime for row in rows], dtype="datetime64[s]")
+        slot_seconds = slot_minutes * 60
+        # 枠の途中にかかる予約は、その枠全体を使用中とみなす
+        start_slots = (starts - base).astype(np.int64) // slot_seconds
+        end_slots = -((base - ends).astype(np.int64) // slot_seconds)
+        start_slots = np.clip(start_slots, 0, slot_count)
+        end_slots = np.clip(end_slots, 0, slot_count)
+        np.add.at(grid, (room_rows, start_slots), 1)
+        np.add.at(grid, (room_rows, end_slots), -1)
+    return np.cumsum(grid, axis=1)[:, :slot_count] > 0
+
+
+# 各行をビット単位に詰めて base64 文字列にする
+def encode_rows(grid: np.ndarray) -> list:
+    packed = np.packbits(grid, axis=1)
+    return [base64.b64encode(row.tobytes()).decode() for row in packed]
+
+
+# encode_rows の逆変換（クライアント向け）
+def decode_row(encoded: str, slot_count: int) -> np.ndarray:
+    packed = np.frombuffer(base64.b64decode(encoded), dtype=np.uint8)
+    return np.unpackbits(packed)[:slot_count].astype(bool)
+
+
+# 1日の開始・終了日時（UTC）と枠数を求める
+def day_range(date, slot_minutes: int, utc_offset_minutes: int = 0):
+    day_start = datetime(date.year, date.month, date.day) - timedelta(
+        minutes=utc_offset_minutes
+    )
+    day_end = day_start + timedelta(days=1)
+    return day_start, day_end, (24 * 60) // slot_minutes
@@ -0,0 +1,50 @@
+# pagination.py
+import base64
+import json
+from datetime import datetime
+
+from fastapi import HTTPException, Response
+
+# 次ページのカーソルを返すレスポンスヘッダー
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+# キーの値のリストを不透明なカーソル文字列に変換する
+def encode_cursor(values: list) -> str:
+    payload = [
+        value.isoformat() if isinstance(value, datetime) else value for value in values
+    ]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+# カーソル文字列をキーの値のリストに戻す
+# types はキーごとの型（int または datetime）で、合わない場合は 400 にする
+def decode_cursor(cursor: str, *types) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(types):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return [
+        _cursor_value(value, value_type) for value, value_type in zip(values, types)
+    ]
+
+
+def _cursor_value(value, value_type):
+    if value_type is datetime and isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            pass
+    elif value_type is int and isinstance(value, int) and not isinstance(value, bool):
+        return value
+    raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+# ページが埋まっている場合のみ、最後の行から次ページのカーソルを設定する
+def set_next_cursor(response: Response, items: list, limit: int, key) -> None:
+    if items and len(items) >= limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(key(items[-1]))
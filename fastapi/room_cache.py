@@ -0,0 +1,101 @@
+# room_cache.py
+import threading
+import time
+
+from sqlalchemy import select
+
+import models
+import schemas
+from settings import settings
+
+
+# 会議室一覧のプロセス内キャッシュ
+# 初回参照時に読み込み、会議室の登録・更新・削除時に破棄する。
+# 他のワーカープロセスでの更新は ttl 秒以内に反映される。
+# 見つからないIDでの読み込み直しは miss_reload_interval 秒に1回までとする。
+class RoomCatalog:
+    def __init__(self, ttl: float, miss_reload_interval: float = 1.0):
+        self.ttl = ttl
+        self.miss_reload_interval = miss_reload_interval
+        self.loads = 0
+        self._catalog = None  # (room_id 順のリスト, room_id -> Room)
+        self._loaded_at = 0.0
+        self._miss_reloaded_at = 0.0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    # 会議室一覧（room_id 順）を取得する
+    def rooms(self, db):
+        return self._catalog_or_load(db)[0]
+
+    async def rooms_async(self, db):
+        return (await self._catalog_or_load_async(db))[0]
+
+    # 会議室をIDで取得する
+    # 見つからない場合は、直近に読み込んでいなければ一度だけ読み込み直す
+    def get(self, db, room_id: int):
+        room = self._catalog_or_load(db)[1].get(room_id)
+        if room is None and self._claim_miss_reload():
+            room = self._load(db)[1].get(room_id)
+        return room
+
+    async def get_async(self, db, room_id: int):
+        room = (await self._catalog_or_load_async(db))[1].get(room_id)
+        if room is None and self._claim_miss_reload():
+            room = (await self._load_async(db))[1].get(room_id)
+        return room
+
+    # 会議室の書き込み後に呼び出し、次回の参照で読み込み直す
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._catalog = None
+
+    def _fresh_catalog(self):
+        with self._lock:
+            if (
+                self._catalog is not None
+                and time.monotonic() - self._loaded_at < self.ttl
+            ):
+                return self._catalog
+            return None
+
+    # 存在しないIDの参照が続いても、読み込み直しは一定間隔に1回に抑える
+    def _claim_miss_reload(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            last = max(self._loaded_at, self._miss_reloaded_at)
+            if now - last < self.miss_reload_interval:
+                return False
+            self._miss_reloaded_at = now
+            return True
+
+    def _catalog_or_load(self, db):
+        return self._fresh_catalog() or self._load(db)
+
+    async def _catalog_or_load_async(self, db):
+        return self._fresh_catalog() or await self._load_async(db)
+
+    def _load(self, db):
+        generation = self._generation
+        rows = db.query(models.Room).order_by(models.Room.room_id).all()
+        return self._store(rows, generation)
+
+    async def _load_async(self, db):
+        generation = self._generation
+        result = await db.execute(select(models.Room).order_by(models.Room.room_id))
+        return self._store(result.scalars().all(), generation)
+
+    def _store(self, rows, generation):
+        rooms = [schemas.Room.model_validate(row, from_attributes=True) for row in rows]
+        catalog = (rooms, {room.room_id: room for room in rooms})
+        with self._lock:
+            # 読み込み中に書き込みがあった場合は古い内容を保持しない
+            if generation == self._generation:
+                self._catalog = catalog
+                self._loaded_at = time.monotonic()
+                self.loads += 1
+        return catalog
+
+
+room_catalog = RoomCatalog(settings.room_cache_ttl)
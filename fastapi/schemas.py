@@ -1,6 +1,6 @@
 # schemas.py
-from pydantic import BaseModel, Field
-from datetime import datetime
+from pydantic import BaseModel, Field, model_validator
+from datetime import date, datetime
 from passlib.context import CryptContext
 from typing import Optional, List
 from pydantic import constr
@@ -44,6 +44,33 @@ class User(UserBase):
         orm_mode = True
 
 
+# 社員番号の一括解決用のリクエスト
+class UserResolveRequest(BaseModel):
+    employee_numbers: List[str] = Field(..., max_length=1000)
+
+
+# 社員番号の一括解決の結果（見つからなかった社員番号も返す）
+class UserResolveResponse(BaseModel):
+    users: List[User]
+    unknown_employee_numbers: List[str]
+
+
+# ユーザー一括登録の1行ごとの結果（row は 1 始まりの行番号。CSV はヘッダーを除く）
+class UserImportResult(BaseModel):
+    row: int
+    employee_number: Optional[str] = None
+    status: str  # created または error
+    user_id: Optional[int] = None
+    error: Optional[str] = None
+
+
+# ユーザー一括登録の結果
+class UserImportReport(BaseModel):
+    created: int
+    failed: int
+    results: List[UserImportResult]
+
+
 # 会議室の基本情報
 class RoomBase(BaseModel):
     room_name: str = Field(max_length=50)
@@ -65,11 +92,63 @@ class RoomUpdate(RoomBase):
 # 会議室の読み取り用スキーマ
 class Room(RoomBase):
     room_id: int
+    version: int = 1  # If-Match で送る版数（ETag と同じ値）
+
+    class Config:
+        orm_mode = True
+
+
+# 空き時間帯
+class TimeSlot(BaseModel):
+    start_datetime: datetime
+    end_datetime: datetime
+
+
+# 空き会議室の読み取り用スキーマ
+class AvailableRoom(Room):
+    free_slots: List[TimeSlot] = []
 
     class Config:
         orm_mode = True
 
 
+# 会議室ごとの使用状況（1枠1ビットに詰めて base64 にしたもの）
+class RoomOccupancy(BaseModel):
+    room_id: int
+    room_name: str
+    occupancy: str
+
+
+# 会議室 × 時間枠の使用状況
+class OccupancyGrid(BaseModel):
+    date: date
+    start_datetime: datetime  # 最初の枠の開始日時（UTC）
+    slot_minutes: int
+    slot_count: int
+    encoding: str = "packbits-base64"
+    rooms: List[RoomOccupancy]
+
+
+# 稼働率の集計結果（グループごと）
+class UtilizationGroup(BaseModel):
+    key: str  # room_id / 日付 / 時（00〜23）
+    booked_hours: float
+    booking_count: int
+    utilization_percent: float
+    room_id: Optional[int] = None
+    room_name: Optional[str] = None
+    peak_hour: Optional[int] = None
+
+
+# 稼働率の集計結果
+class UtilizationReport(BaseModel):
+    from_date: date
+    to_date: date
+    group_by: str
+    room_count: int
+    groups: List[UtilizationGroup]
+
+
 # 予約の基本情報
 class BookingBase(BaseModel):
     user_id: int
@@ -97,11 +176,51 @@ class BookingUpdate(BookingBase):
 # 予約の読み取り用スキーマ
 class Booking(BookingBase):
     booking_id: int
+    series_id: Optional[int] = None
+    version: int = 1  # If-Match で送る版数（ETag と同じ値）
+
+    class Config:
+        orm_mode = True
+
+
+# 予約の詳細（会議室・代表者・メンバー・ゲスト付き）
+# 一覧の include で指定しなかった項目は null になる
+class BookingDetail(Booking):
+    main_user_id: Optional[int] = None
+    room: Optional[Room] = None
+    main_user: Optional[User] = None
+    members: Optional[List[User]] = None
+    guests: Optional[List["GuestUser"]] = None
 
     class Config:
         orm_mode = True
 
 
+# 定期予約の作成用スキーマ（RRULE の FREQ / INTERVAL / COUNT / UNTIL 相当）
+class BookingSeriesCreate(BaseModel):
+    user_id: int
+    room_id: int
+    start_datetime: datetime  # 初回の開始日時
+    end_datetime: datetime  # 初回の終了日時
+    freq: str = Field(..., pattern="^(DAILY|WEEKLY)$")
+    interval: int = Field(1, ge=1, le=365)
+    count: Optional[int] = Field(None, ge=1)
+    until: Optional[datetime] = None
+
+    @model_validator(mode="after")
+    def check_until(self):
+        if self.until is not None and self.until < self.start_datetime:
+            raise ValueError("until must not be before start_datetime")
+        return self
+
+
+# 定期予約の作成結果（重複して登録できなかった回も返す）
+class BookingSeriesResult(BaseModel):
+    series_id: int
+    bookings: List[Booking]
+    conflicts: List[TimeSlot]
+
+
 # ゲストユーザーの基本情報
 class GuestUserBase(BaseModel):
     name: str = Field(max_length=255)
@@ -133,3 +252,6 @@ class Participant(BaseModel):
 
 class BookingWithParticipants(BaseModel):
     participants: List[Participant]
+
+
+BookingDetail.model_rebuild()
@@ -1,9 +1,32 @@
 # security.py
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 from passlib.context import CryptContext
+from settings import settings
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt は CPU を使い GIL を解放するため、専用のスレッドプールで同時実行数を制限して実行する
+password_executor = ThreadPoolExecutor(
+    max_workers=settings.password_hash_workers, thread_name_prefix="password-hash"
+)
+
+# 一括登録用のプロセスプール（初回の一括登録時に起動する）
+# 数千件のハッシュ化でログイン用のスレッドプールを塞がないよう別に用意する
+_bulk_hash_executor = None
+
+
+def get_bulk_hash_executor():
+    global _bulk_hash_executor
+    if _bulk_hash_executor is None:
+        _bulk_hash_executor = ProcessPoolExecutor(
+            max_workers=settings.password_hash_processes,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _bulk_hash_executor
+
 
 def hash_password(password: str):
     return pwd_context.hash(password)
@@ -11,3 +34,39 @@ def hash_password(password: str):
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
+
+
+# イベントループを止めずにパスワードをハッシュ化する
+async def hash_password_async(password: str, executor=None):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        executor or password_executor, hash_password, password
+    )
+
+
+# イベントループを止めずにパスワードを検証する
+async def verify_password_async(plain_password, hashed_password, executor=None):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        executor or password_executor, verify_password, plain_password, hashed_password
+    )
+
+
+def hash_passwords(passwords: list):
+    return [hash_password(password) for password in passwords]
+
+
+# 複数のパスワードをプロセスプールで並列にハッシュ化する（入力と同じ順で返す）
+# プロセス間通信の回数を減らすため chunk_size 件ずつまとめてワーカーに渡す
+async def hash_passwords_parallel(passwords: list, executor=None, chunk_size=32):
+    loop = asyncio.get_running_loop()
+    executor = executor or get_bulk_hash_executor()
+    chunks = await asyncio.gather(
+        *(
+            loop.run_in_executor(
+                executor, hash_passwords, passwords[i : i + chunk_size]
+            )
+            for i in range(0, len(passwords), chunk_size)
+        )
+    )
+    return [hashed for chunk in chunks for hashed in chunk]
@@ -1,7 +1,13 @@
 # session.py
 
-from database import engine
+from database import engine, async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker
 
 # ここで SessionLocal を定義します
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# 非同期用のセッション（commit 後も属性を参照できるよう expire しない）
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+)
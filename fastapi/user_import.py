@@ -0,0 +1,89 @@
+# user_import.py
+# ユーザー一括登録の入力（CSV / JSON）を読み込み、1行ずつ検証する
+import csv
+import io
+import json
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+
+import schemas
+
+# 1回のリクエストで登録できる最大件数
+MAX_IMPORT_ROWS = 10000
+
+# CSV の列（1行目はヘッダー）
+CSV_COLUMNS = ("username", "role", "employee_number", "password")
+
+
+# リクエストボディを行（dict）のリストにする
+# Content-Type が text/csv なら CSV、それ以外は JSON（配列または {"users": [...]}）として読む
+def parse_user_rows(body: bytes, content_type: str) -> list:
+    try:
+        text = body.decode("utf-8-sig")
+        if "csv" in content_type:
+            reader = csv.DictReader(io.StringIO(text))
+            missing = set(CSV_COLUMNS) - set(reader.fieldnames or ())
+            if missing:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Missing CSV columns: {', '.join(sorted(missing))}",
+                )
+            rows = list(reader)
+        else:
+            rows = json.loads(text)
+            if isinstance(rows, dict):
+                rows = rows.get("users")
+    except (UnicodeDecodeError, ValueError, csv.Error):
+        raise HTTPException(status_code=400, detail="Invalid request body")
+    if not isinstance(rows, list):
+        raise HTTPException(status_code=400, detail="Expected a list of users")
+    if len(rows) > MAX_IMPORT_ROWS:
+        raise HTTPException(
+            status_code=413, detail=f"At most {MAX_IMPORT_ROWS} users per request"
+        )
+    return rows
+
+
+def _error_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(map(str, item['loc']))}: {item['msg']}" for item in error.errors()
+    )
+
+
+# 各行を UserCreate として検証する
+# 戻り値は (行番号, UserCreate) のリストと、行番号 → エラーメッセージ
+def validate_user_rows(rows: list):
+    users, errors = [], {}
+    for row_number, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            errors[row_number] = "Expected an object"
+            continue
+        try:
+            users.append((row_number, schemas.UserCreate.model_validate(row)))
+        except ValidationError as error:
+            errors[row_number] = _error_message(error)
+    return users, errors
+
+
+# 1行ごとの結果をまとめる（employee_number は文字列の場合のみ返す）
+def import_report(rows: list, created_ids: dict, errors: dict) -> dict:
+    results = []
+    for row_number, row in enumerate(rows, start=1):
+        employee_number = row.get("employee_number") if isinstance(row, dict) else None
+        result = {
+            "row": row_number,
+            "employee_number": (
+                employee_number if isinstance(employee_number, str) else None
+            ),
+        }
+        if row_number in created_ids:
+            result.update(status="created", user_id=created_ids[row_number])
+        else:
+            result.update(status="error", error=errors[row_number])
+        results.append(result)
+    return {
+        "created": len(created_ids),
+        "failed": len(rows) - len(created_ids),
+        "results": results,
+    }
@@ -0,0 +1,167 @@
+# api_client.py
+# FastAPI サーバーへのリクエストをまとめるクライアント
+import os
+import threading
+from collections import OrderedDict
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# FastAPIサーバーのURL
+BASE_URL = os.getenv("API_BASE_URL", "http://127.0.0.1:8000")
+
+# (接続, 読み込み) のタイムアウト秒数
+TIMEOUT = (
+    float(os.getenv("API_CONNECT_TIMEOUT", "3.05")),
+    float(os.getenv("API_READ_TIMEOUT", "10")),
+)
+# 接続エラーや 502/503/504 のときのリトライ回数（書き込みは接続できなかった場合のみ）
+RETRIES = int(os.getenv("API_RETRIES", "3"))
+# 参照系のキャッシュ保持秒数
+CACHE_TTL = int(os.getenv("API_CACHE_TTL", "60"))
+# 条件付き GET のために ETag と一緒に保持するレスポンスの件数
+VALIDATOR_CACHE_SIZE = int(os.getenv("API_VALIDATOR_CACHE_SIZE", "256"))
+
+
+# Streamlit の再実行をまたいで共有する keep-alive のセッション
+@st.cache_resource
+def get_session():
+    retry = Retry(
+        total=RETRIES,
+        backoff_factor=0.3,
+        status_forcelist=(502, 503, 504),
+        # 応答が失われても書き込みは済んでいる場合があるため、参照系だけを再送する
+        # （If-Match 付きの PUT を再送すると、自分の更新と 412 で競合してしまう）
+        allowed_methods=frozenset({"GET", "HEAD"}),
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=20, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# URL ごとに直近の ETag 付きレスポンスを保持する LRU
+class ValidatorCache:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._responses = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, url: str):
+        with self._lock:
+            response = self._responses.get(url)
+            if response is not None:
+                self._responses.move_to_end(url)
+            return response
+
+    def put(self, url: str, response):
+        with self._lock:
+            self._responses[url] = response
+            self._responses.move_to_end(url)
+            while len(self._responses) > self.maxsize:
+                self._responses.popitem(last=False)
+
+
+# 全セッションで共有する ETag のキャッシュ
+@st.cache_resource
+def get_validator_cache():
+    return ValidatorCache(VALIDATOR_CACHE_SIZE)
+
+
+def request(method: str, path: str, **kwargs):
+    kwargs.setdefault("timeout", TIMEOUT)
+    response = get_session().request(method, f"{BASE_URL}{path}", **kwargs)
+    if method != "GET":
+        invalidate(path)
+    return response
+
+
+# 前回の ETag を If-None-Match で送り、304 の場合は保持しているレスポンスを返す
+def get(path: str, **kwargs):
+    url = (
+        requests.Request("GET", f"{BASE_URL}{path}", params=kwargs.get("params"))
+        .prepare()
+        .url
+    )
+    cache = get_validator_cache()
+    cached = cache.get(url)
+    if cached is not None:
+        kwargs["headers"] = {
+            **kwargs.get("headers", {}),
+            "If-None-Match": cached.headers["ETag"],
+        }
+    response = request("GET", path, **kwargs)
+    if response.status_code == 304 and cached is not None:
+        return cached
+    if response.status_code == 200 and "ETag" in response.headers:
+        cache.put(url, response)
+    return response
+
+
+def post(path: str, **kwargs):
+    return request("POST", path, **kwargs)
+
+
+def put(path: str, **kwargs):
+    return request("PUT", path, **kwargs)
+
+
+def delete(path: str, **kwargs):
+    return request("DELETE", path, **kwargs)
+
+
+# 更新する前の内容と ETag（PUT の If-Match に付ける版数）を取得する
+# 見つからない場合は (None, None)
+def get_for_update(path: str):
+    response = get(path)
+    if response.status_code == 200:
+        return response.json(), response.headers.get("ETag")
+    return None, None
+
+
+# 会議室をIDで取得する（見つからない場合は None）
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def get_room(room_id):
+    response = get(f"/rooms/{room_id}")
+    if response.status_code == 200:
+        return response.json()
+    return None
+
+
+# ユーザーを社員番号で取得する（見つからない場合は None）
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def get_user_by_employee_number(employee_number):
+    response = get(f"/users/employee_number/{employee_number}")
+    if response.status_code == 200:
+        return response.json()
+    return None
+
+
+# 複数の社員番号をまとめてユーザー情報に変換する
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def resolve_users(employee_numbers: tuple):
+    response = post_uncached(
+        "/users/resolve", json={"employee_numbers": list(employee_numbers)}
+    )
+    response.raise_for_status()
+    result = response.json()
+    users_by_number = {user["employee_number"]: user for user in result["users"]}
+    return users_by_number, result["unknown_employee_numbers"]
+
+
+# 参照のみの POST（キャッシュを破棄しない）
+def post_uncached(path: str, **kwargs):
+    kwargs.setdefault("timeout", TIMEOUT)
+    return get_session().post(f"{BASE_URL}{path}", **kwargs)
+
+
+# 書き込み後に、影響するキャッシュを破棄する
+def invalidate(path: str):
+    if path.startswith("/rooms"):
+        get_room.clear()
+    if path.startswith("/users"):
+        get_user_by_employee_number.clear()
+        resolve_users.clear()
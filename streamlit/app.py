@@ -1,11 +1,13 @@
 import streamlit as st
 import requests
-from datetime import datetime
+from datetime import datetime, timedelta
 import hashlib
 import pytz
-
-# FastAPIサーバーのURL
-BASE_URL = "http://127.0.0.1:8000"
+import base64
+import altair as alt
+import numpy as np
+import pandas as pd
+import api_client
 
 
 def generate_hash(password):
@@ -59,7 +61,7 @@ else:
 
 # ユーザー関連の関数
 def list_users():
-    response = requests.get(f"{BASE_URL}/users/")
+    response = api_client.get("/users/")
     if response.status_code == 200:
         users = response.json()
         for user in users:
@@ -75,8 +77,8 @@ def create_user():
         password = st.text_input("Password", type="password")
         submitted = st.form_submit_button("Create")
         if submitted:
-            response = requests.post(
-                f"{BASE_URL}/users/",
+            response = api_client.post(
+                "/users/",
                 json={
                     "username": username,
                     "email": email,
@@ -100,8 +102,8 @@ def update_user():
         employee_number = st.text_input("社員番号入力")
         submitted = st.form_submit_button("Update")
         if submitted:
-            response = requests.put(
-                f"{BASE_URL}/users/{user_id}",
+            response = api_client.put(
+                f"/users/{user_id}",
                 json={
                     "username": username,
                     "email": email,
@@ -120,7 +122,7 @@ def delete_user():
         user_id = st.text_input("ユーザー ID")
         submitted = st.form_submit_button("削除")
         if submitted:
-            response = requests.delete(f"{BASE_URL}/users/{user_id}")
+            response = api_client.delete(f"/users/{user_id}")
             if response.status_code == 200:
                 st.success("User deleted successfully!")
             else:
@@ -129,7 +131,7 @@ def delete_user():
 
 # 会議室関連の関数
 def list_rooms():
-    response = requests.get(f"{BASE_URL}/rooms/")
+    response = api_client.get("/rooms/")
     if response.status_code == 200:
         rooms = response.json()
         for room in rooms:
@@ -147,8 +149,8 @@ def create_room():
             # executiveの値をブーリアンに変換
             executive_bool = executive == "Yes"
 
-            response = requests.post(
-                f"{BASE_URL}/rooms/",
+            response = api_client.post(
+                "/rooms/",
                 json={
                     "room_name": room_name,
                     "capacity": capacity,
@@ -162,28 +164,43 @@ def create_room():
                 st.error("Failed to create room")
 
 
+# 更新の結果を表示する（412 は読み込んだ後に他のユーザーが更新した場合）
+def show_update_result(response, name):
+    if response.status_code == 200:
+        st.success(f"{name} updated successfully!")
+    elif response.status_code == 412:
+        st.error(f"他のユーザーが先に{name}を更新しました。読み込み直してから更新してください。")
+    else:
+        st.error(f"Failed to update {name.lower()}: {response.text}")
+
+
 def update_room():
+    room_id = st.text_input("Room ID")
+    if not room_id:
+        return
+    # 現在の内容を初期値にし、読み込んだ版数（ETag）を If-Match で送る
+    room, etag = api_client.get_for_update(f"/rooms/{room_id}")
+    if room is None:
+        st.error("Room not found")
+        return
     with st.form("会議室更新"):
-        room_id = st.text_input("Room ID")
-        room_name = st.text_input("Room Name")
-        capacity = st.text_input("Capacity")
-        photo_url = st.text_input("Photo URL")
-        executive = st.text_input("Executive")
+        room_name = st.text_input("Room Name", room["room_name"])
+        capacity = st.text_input("Capacity", str(room["capacity"]))
+        photo_url = st.text_input("Photo URL", room["photo_url"] or "")
+        executive = st.text_input("Executive", str(room["executive"]))
         submitted = st.form_submit_button("Update")
         if submitted:
-            response = requests.put(
-                f"{BASE_URL}/rooms/{room_id}",
+            response = api_client.put(
+                f"/rooms/{room_id}",
                 json={
                     "room_name": room_name,
                     "capacity": capacity,
                     "photo_url": photo_url,
                     "executive": executive,
                 },
+                headers={"If-Match": etag},
             )
-            if response.status_code == 200:
-                st.success("Room updated successfully!")
-            else:
-                st.error("Failed to update room")
+            show_update_result(response, "Room")
 
 
 def delete_room():
@@ -191,7 +208,7 @@ def delete_room():
         room_id = st.text_input("Room ID")
         submitted = st.form_submit_button("Delete")
         if submitted:
-            response = requests.delete(f"{BASE_URL}/rooms/{room_id}")
+            response = api_client.delete(f"/rooms/{room_id}")
             if response.status_code == 200:
                 st.success("Room deleted successfully!")
             else:
@@ -199,20 +216,66 @@ def delete_room():
 
 
 # 予約関連の関数
+# 予約リストの絞り込み条件を入力し、/bookings/ のクエリパラメータにする
+# 期間は日本時間の日付で指定し、既定は今週（月曜〜日曜）
+def booking_filter_params(key):
+    local_tz_str = "Asia/Tokyo"
+    today = datetime.now(pytz.timezone(local_tz_str)).date()
+    week_start = today - timedelta(days=today.weekday())
+    col1, col2 = st.columns(2)
+    start_date = col1.date_input("開始日", week_start, key=f"{key}_from")
+    end_date = col2.date_input("終了日", week_start + timedelta(days=6), key=f"{key}_to")
+    room_id = st.number_input(
+        "Room ID（0 はすべて）", min_value=0, format="%d", key=f"{key}_room"
+    )
+    employee_number = st.text_input("社員番号（空欄はすべて）", key=f"{key}_user")
+    newest_first = st.checkbox("新しい順", key=f"{key}_sort")
+
+    params = {
+        "start_from": convert_local_to_utc(
+            f"{start_date.isoformat()}T00:00:00", local_tz_str
+        ),
+        "start_to": convert_local_to_utc(
+            f"{(end_date + timedelta(days=1)).isoformat()}T00:00:00", local_tz_str
+        ),
+        "sort": "desc" if newest_first else "asc",
+    }
+    if room_id:
+        params["room_id"] = room_id
+    if employee_number:
+        user_info = api_client.get_user_by_employee_number(employee_number)
+        if user_info is None:
+            st.error("User not found")
+            return None
+        params["user_id"] = user_info["user_id"]
+    return params
+
+
+# 絞り込んだ予約を日本時間に変換して表示する
+def show_bookings(params):
+    response = api_client.get("/bookings/", params=params)
+    if response.status_code != 200:
+        st.error(f"Failed to load bookings: {response.text}")
+        return
+    bookings = response.json()
+    if not bookings:
+        st.info("該当する予約はありません")
+    local_tz_str = "Asia/Tokyo"  # 例として東京のタイムゾーンを使用
+    for booking in bookings:
+        # UTCからローカルタイムゾーンへの変換
+        booking["start_datetime"] = convert_utc_to_local(
+            booking["start_datetime"], local_tz_str
+        )
+        booking["end_datetime"] = convert_utc_to_local(
+            booking["end_datetime"], local_tz_str
+        )
+        st.write(booking)
+
+
 def list_bookings():
-    response = requests.get(f"{BASE_URL}/bookings/")
-    if response.status_code == 200:
-        bookings = response.json()
-        local_tz_str = "Asia/Tokyo"  # 例として東京のタイムゾーンを使用
-        for booking in bookings:
-            # UTCからローカルタイムゾーンへの変換
-            booking["start_datetime"] = convert_utc_to_local(
-                booking["start_datetime"], local_tz_str
-            )
-            booking["end_datetime"] = convert_utc_to_local(
-                booking["end_datetime"], local_tz_str
-            )
-            st.write(booking)
+    params = booking_filter_params("bookings")
+    if params is not None:
+        show_bookings(params)
 
 
 def create_booking():
@@ -250,17 +313,6 @@ def create_booking():
             st.session_state["start_datetime"] = start_datetime
             st.session_state["end_datetime"] = end_datetime
             try:
-                user_response = requests.get(
-                    f"{BASE_URL}/users/employee_number/{main_user_employee_number}"
-                )
-
-                if user_response.status_code != 200:
-                    st.error("Failed to retrieve user information.")
-                    return
-
-                user_info = user_response.json()
-                user_id = user_info["user_id"]
-
                 member_employee_numbers = [
                     num.strip()
                     for num in additional_member_numbers.split(",")
@@ -270,6 +322,16 @@ def create_booking():
                     name.strip() for name in guest_names.split(",") if name.strip()
                 ]
 
+                # 代表者と参加社員をまとめて1回のリクエストで確認する
+                users_by_number, unknown_numbers = api_client.resolve_users(
+                    (main_user_employee_number, *member_employee_numbers)
+                )
+                if unknown_numbers:
+                    st.error(f"社員番号が見つかりません: {', '.join(unknown_numbers)}")
+                    return
+
+                user_id = users_by_number[main_user_employee_number]["user_id"]
+
                 # UTCに戻すための変換
                 start_datetime_utc = convert_local_to_utc(start_datetime, local_tz_str)
                 end_datetime_utc = convert_local_to_utc(end_datetime, local_tz_str)
@@ -289,8 +351,8 @@ def create_booking():
                 print("Sending booking request with the following data:")
                 print(booking_data)
 
-                response = requests.post(
-                    f"{BASE_URL}/bookings/",
+                response = api_client.post(
+                    "/bookings/",
                     json={
                         "room_id": room_id,
                         "user_id": user_id,
@@ -311,35 +373,38 @@ def create_booking():
 
 
 def get_room_capacity(room_id):
-    response = requests.get(f"{BASE_URL}/rooms/{room_id}")
-    if response.status_code == 200:
-        room = response.json()
+    room = api_client.get_room(room_id)
+    if room is not None:
         return room.get("capacity", 0)
     return 0
 
 
 def update_booking():
-    # 現在の日時を取得し、ローカルタイムゾーンに変換
-    current_utc_datetime = datetime.now(pytz.utc).strftime("%Y-%m-%dT%H:%M:%S")
     local_tz_str = "Asia/Tokyo"
-    current_local_datetime = convert_utc_to_local(current_utc_datetime, local_tz_str)
+
+    booking_id = st.text_input("Booking ID")
+    if not booking_id:
+        return
+    # 現在の内容を初期値にし、読み込んだ版数（ETag）を If-Match で送る
+    booking, etag = api_client.get_for_update(f"/bookings/{booking_id}")
+    if booking is None:
+        st.error("Booking not found")
+        return
 
     with st.form("Update Booking"):
-        booking_id = st.text_input("Booking ID")
         main_user_employee_number = st.text_input("Main User Employee Number")
-        room_id = st.number_input("Room ID", min_value=1, format="%d")
+        room_id = st.number_input(
+            "Room ID", min_value=1, value=booking["room_id"], format="%d"
+        )
         additional_member_numbers = st.text_area("参加する社員は社員ID入力 (comma separated)")
         guest_names = st.text_area("ゲストは名前入力 (comma separated)")
-        # Streamlitのstateを使用して日時を取得
-        if "start_datetime" not in st.session_state:
-            st.session_state["start_datetime"] = current_local_datetime
-        if "end_datetime" not in st.session_state:
-            st.session_state["end_datetime"] = current_local_datetime
-
         start_datetime = st.text_input(
-            "Start Datetime", st.session_state["start_datetime"]
+            "Start Datetime",
+            convert_utc_to_local(booking["start_datetime"], local_tz_str),
+        )
+        end_datetime = st.text_input(
+            "End Datetime", convert_utc_to_local(booking["end_datetime"], local_tz_str)
         )
-        end_datetime = st.text_input("End Datetime", st.session_state["end_datetime"])
 
         print(f"User Input - Start Datetime: {start_datetime}")
 
@@ -348,14 +413,13 @@ def update_booking():
         if submitted:
             # 更新ボタンが押されたら、すべてのチェックを行う
             # ユーザー情報の取得
-            user_response = requests.get(
-                f"{BASE_URL}/users/employee_number/{main_user_employee_number}"
+            user_info = api_client.get_user_by_employee_number(
+                main_user_employee_number
             )
-            if user_response.status_code != 200:
+            if user_info is None:
                 st.error("Failed to retrieve user information.")
                 return
 
-            user_info = user_response.json()
             user_id = user_info.get("user_id")  # ユーザーIDの取得
 
             # 部屋のキャパシティを取得して表示
@@ -374,8 +438,8 @@ def update_booking():
 
             # 予約の更新処理
             try:
-                response = requests.put(
-                    f"{BASE_URL}/bookings/{booking_id}",
+                response = api_client.put(
+                    f"/bookings/{booking_id}",
                     json={
                         "user_id": user_id,  # ユーザーIDをリクエストに追加
                         "main_user_employee_number": main_user_employee_number,
@@ -385,11 +449,9 @@ def update_booking():
                         "start_datetime": start_datetime_utc,
                         "end_datetime": end_datetime_utc,
                     },
+                    headers={"If-Match": etag},
                 )
-                if response.status_code == 200:
-                    st.success("Booking updated successfully!")
-                else:
-                    st.error(f"Failed to update booking: {response.text}")
+                show_update_result(response, "Booking")
             except requests.RequestException as e:
                 st.error(f"Network error: {e}")
 
@@ -399,7 +461,7 @@ def delete_booking():
         booking_id = st.text_input("Booking ID")
         submitted = st.form_submit_button("Delete")
         if submitted:
-            response = requests.delete(f"{BASE_URL}/bookings/{booking_id}")
+            response = api_client.delete(f"/bookings/{booking_id}")
             if response.status_code == 200:
                 st.success("Booking deleted successfully!")
             else:
@@ -411,7 +473,7 @@ def delete_booking():
 
 # ゲストユーザー関連の関数
 def list_guest_users():
-    response = requests.get(f"{BASE_URL}/guest_users/")
+    response = api_client.get("/guest_users/")
     if response.status_code == 200:
         guest_users = response.json()
         for guest_user in guest_users:
@@ -432,7 +494,7 @@ def create_guest_user():
             # リクエストデータのデバッグ出力
             st.write("Request Data:", guest_user_data)
 
-            response = requests.post(f"{BASE_URL}/guest_users/", json=guest_user_data)
+            response = api_client.post("/guest_users/", json=guest_user_data)
 
             # レスポンスのデバッグ出力
             st.write("Response Status Code:", response.status_code)
@@ -454,8 +516,8 @@ def update_guest_user():
             guest_user_data = {"name": name}
             if booking_id:
                 guest_user_data["booking_id"] = int(booking_id)
-            response = requests.put(
-                f"{BASE_URL}/guest_users/{guest_user_id}",
+            response = api_client.put(
+                f"/guest_users/{guest_user_id}",
                 json=guest_user_data,
             )
             if response.status_code == 200:
@@ -469,7 +531,7 @@ def delete_guest_user():
         guest_user_id = st.text_input("Guest User ID")
         submitted = st.form_submit_button("Delete")
         if submitted:
-            response = requests.delete(f"{BASE_URL}/guest_users/{guest_user_id}")
+            response = api_client.delete(f"/guest_users/{guest_user_id}")
             if response.status_code == 200:
                 st.success("Guest User deleted successfully!")
             else:
@@ -477,20 +539,10 @@ def delete_guest_user():
 
 
 def list_executive_booking():
-    # 役員用の予約リスト表示機能
-    response = requests.get(f"{BASE_URL}/bookings/")
-    if response.status_code == 200:
-        bookings = response.json()
-        local_tz_str = "Asia/Tokyo"
-        for booking in bookings:
-            # UTCからローカルタイムゾーンへの変換
-            booking["start_datetime"] = convert_utc_to_local(
-                booking["start_datetime"], local_tz_str
-            )
-            booking["end_datetime"] = convert_utc_to_local(
-                booking["end_datetime"], local_tz_str
-            )
-            st.write(booking)
+    # 役員用の予約リスト表示機能（役員用会議室の予約のみ）
+    params = booking_filter_params("executive_bookings")
+    if params is not None:
+        show_bookings({**params, "executive_only": True})
 
 
 def create_executive_booking():
@@ -523,11 +575,8 @@ def create_executive_booking():
         end_datetime_utc = convert_local_to_utc(end_datetime, local_tz_str)
 
         # 社員番号に基づいてユーザー情報を取得
-        user_response = requests.get(
-            f"{BASE_URL}/users/employee_number/{employee_number}"
-        )
-        if user_response.status_code == 200:
-            user_info = user_response.json()
+        user_info = api_client.get_user_by_employee_number(employee_number)
+        if user_info is not None:
             st.write("User info:", user_info)  # ユーザー情報のデバッグ表示
             if user_info["role"] != "役員":
                 st.error("Only executives are allowed to make bookings.")
@@ -546,8 +595,8 @@ def create_executive_booking():
                     name.strip() for name in guest_names.split(",") if name.strip()
                 ]
 
-                response = requests.post(
-                    f"{BASE_URL}/bookings/",
+                response = api_client.post(
+                    "/bookings/",
                     json={
                         "user_id": user_id,
                         "room_id": room_id,
@@ -569,26 +618,29 @@ def create_executive_booking():
 
 
 def update_executive_booking():
-    # 現在の日時を取得し、ローカルタイムゾーンに変換
-    current_utc_datetime = datetime.now(pytz.utc).strftime("%Y-%m-%dT%H:%M:%S")
     local_tz_str = "Asia/Tokyo"
-    current_local_datetime = convert_utc_to_local(current_utc_datetime, local_tz_str)
+
+    booking_id = st.text_input("Booking ID")
+    if not booking_id:
+        return
+    # 現在の内容を初期値にし、読み込んだ版数（ETag）を If-Match で送る
+    booking, etag = api_client.get_for_update(f"/bookings/{booking_id}")
+    if booking is None:
+        st.error("Booking not found")
+        return
 
     with st.form("Update Executive Booking"):
-        booking_id = st.text_input("Booking ID")
         new_employee_number = st.text_input("New Employee Number")
-        new_room_id = st.number_input("New Room ID", min_value=1, format="%d")
-        # Streamlitのstateを使用してデフォルトの日時を設定
-        if "new_start_datetime" not in st.session_state:
-            st.session_state["new_start_datetime"] = current_local_datetime
-        if "new_end_datetime" not in st.session_state:
-            st.session_state["new_end_datetime"] = current_local_datetime
-
+        new_room_id = st.number_input(
+            "New Room ID", min_value=1, value=booking["room_id"], format="%d"
+        )
         new_start_datetime = st.text_input(
-            "New Start Datetime", st.session_state["new_start_datetime"]
+            "New Start Datetime",
+            convert_utc_to_local(booking["start_datetime"], local_tz_str),
         )
         new_end_datetime = st.text_input(
-            "New End Datetime", st.session_state["new_end_datetime"]
+            "New End Datetime",
+            convert_utc_to_local(booking["end_datetime"], local_tz_str),
         )
 
         submitted = st.form_submit_button("Check Role and Update Booking")
@@ -601,11 +653,8 @@ def update_executive_booking():
             new_end_datetime_utc = convert_local_to_utc(new_end_datetime, local_tz_str)
 
             # 新しい社員番号に基づいてユーザー情報を取得
-            user_response = requests.get(
-                f"{BASE_URL}/users/employee_number/{new_employee_number}"
-            )
-            if user_response.status_code == 200:
-                new_user_info = user_response.json()
+            new_user_info = api_client.get_user_by_employee_number(new_employee_number)
+            if new_user_info is not None:
                 if new_user_info["role"] != "役員":
                     st.error("Only executives can update bookings.")
                     return
@@ -618,13 +667,12 @@ def update_executive_booking():
                     "start_datetime": new_start_datetime_utc,
                     "end_datetime": new_end_datetime_utc,
                 }
-                response = requests.put(
-                    f"{BASE_URL}/bookings/{booking_id}", json=update_data
+                response = api_client.put(
+                    f"/bookings/{booking_id}",
+                    json=update_data,
+                    headers={"If-Match": etag},
                 )
-                if response.status_code == 200:
-                    st.success("Booking updated successfully!")
-                else:
-                    st.error(f"Failed to update booking: {response.text}")
+                show_update_result(response, "Booking")
             else:
                 st.error("Failed to retrieve user information.")
 
@@ -637,17 +685,14 @@ def delete_executive_booking():
 
         if submitted:
             # 社員番号に基づいてユーザー情報を取得
-            user_response = requests.get(
-                f"{BASE_URL}/users/employee_number/{employee_number}"
-            )
-            if user_response.status_code == 200:
-                user_info = user_response.json()
+            user_info = api_client.get_user_by_employee_number(employee_number)
+            if user_info is not None:
                 if user_info["role"] != "役員":
                     st.error("Only executives can delete bookings.")
                     return
 
                 # 予約削除処理
-                response = requests.delete(f"{BASE_URL}/bookings/{booking_id}")
+                response = api_client.delete(f"/bookings/{booking_id}")
                 if response.status_code == 200:
                     st.success("Booking deleted successfully!")
                 else:
@@ -656,6 +701,53 @@ def delete_executive_booking():
                 st.error("Failed to retrieve user information.")
 
 
+# フロア全体の会議室 × 時間枠の使用状況をヒートマップで表示する
+def show_occupancy():
+    target_date = st.date_input("日付")
+    slot_minutes = st.selectbox("枠の長さ（分）", [15, 30, 60])
+    response = api_client.get(
+        "/occupancy",
+        params={
+            "date": target_date.isoformat(),
+            "slot_minutes": slot_minutes,
+            "utc_offset_minutes": 540,  # 日本時間の1日を表示する
+        },
+    )
+    if response.status_code != 200:
+        st.error(f"Failed to load occupancy: {response.text}")
+        return
+
+    grid = response.json()
+    slot_count = grid["slot_count"]
+    slot_labels = [
+        f"{minutes // 60:02d}:{minutes % 60:02d}"
+        for minutes in range(0, slot_count * slot_minutes, slot_minutes)
+    ]
+    records = []
+    for room in grid["rooms"]:
+        packed = np.frombuffer(base64.b64decode(room["occupancy"]), dtype=np.uint8)
+        occupied = np.unpackbits(packed)[:slot_count]
+        records.append(
+            pd.DataFrame({"会議室": room["room_name"], "時刻": slot_labels, "予約": occupied})
+        )
+    if not records:
+        st.info("会議室がありません")
+        return
+
+    chart = (
+        alt.Chart(pd.concat(records))
+        .mark_rect()
+        .encode(
+            x=alt.X("時刻:O", sort=slot_labels),
+            y=alt.Y("会議室:N"),
+            color=alt.Color(
+                "予約:Q", scale=alt.Scale(domain=[0, 1], range=["#eeeeee", "#d62728"])
+            ),
+        )
+    )
+    st.altair_chart(chart, use_container_width=True)
+
+
 if "login" not in st.session_state:
     st.session_state["login"] = False
 
@@ -708,6 +800,7 @@ if st.session_state["login"]:
             "役員予約作成",
             "役員予約更新",
             "役員予約削除",
+            "フロア稼働状況",
         ),
     )
 
@@ -754,6 +847,8 @@ elif option == "役員予約更新":
     update_executive_booking()
 elif option == "役員予約削除":
     delete_executive_booking()
+elif option == "フロア稼働状況":
+    show_occupancy()
 
 st.sidebar.markdown("[Next.jsアプリケーションに戻る](http://localhost:3000)")
 
@@ -0,0 +1,31 @@
+# conftest.py
+import os
+import sys
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# fastapi ディレクトリのモジュール（crud, models など）をインポートできるようにする
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "fastapi"))
+
+import models  # noqa: E402
+from room_cache import room_catalog  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def clear_room_catalog():
+    # テストごとに別のDBを使うため、会議室キャッシュを破棄する
+    room_catalog.invalidate()
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
@@ -0,0 +1,35 @@
+# test_auth_cache.py
+import time
+
+import schemas
+from auth_cache import TokenCache
+
+
+def make_user(user_id):
+    return schemas.User(
+        user_id=user_id, username=f"u{user_id}", role="社員", employee_number=str(user_id)
+    )
+
+
+def test_token_cache_hit_miss_and_expiry():
+    cache = TokenCache(maxsize=10, ttl=60)
+    assert cache.get("a") is None
+    cache.put("a", make_user(1), time.time() + 600)
+    cache.put("expired", make_user(2), time.time() - 1)
+    assert cache.get("a").user_id == 1
+    assert cache.get("expired") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+def test_token_cache_evicts_lru_and_invalidates_user():
+    cache = TokenCache(maxsize=2, ttl=60)
+    expires_at = time.time() + 600
+    cache.put("a", make_user(1), expires_at)
+    cache.put("b", make_user(1), expires_at)
+    cache.get("a")
+    cache.put("c", make_user(2), expires_at)
+    assert cache.get("b") is None
+    cache.invalidate_user(1)
+    assert cache.get("a") is None
+    assert cache.get("c").user_id == 2
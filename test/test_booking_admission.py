@@ -0,0 +1,131 @@
+# test_booking_admission.py
+# 同じ会議室・時間帯への同時予約で、登録されるのが1件だけになることを確認する
+# （ファイルの SQLite に複数の接続から同時に書き込む）
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+import crud
+import crud_async
+import models
+import schemas
+
+WORKERS = 16
+SLOT_START = datetime(2030, 1, 1, 10)
+
+
+def make_booking(room_id, offset_minutes=0):
+    # offset_minutes ずつずらしても1時間の枠はすべて互いに重なる
+    start = SLOT_START + timedelta(minutes=offset_minutes)
+    return schemas.BookingCreate(
+        user_id=1,
+        room_id=room_id,
+        main_user_employee_number="0001",
+        member_employee_numbers=[],
+        guest_names=[],
+        start_datetime=start,
+        end_datetime=start + timedelta(hours=1),
+    )
+
+
+@pytest.fixture
+def database_path(tmp_path):
+    path = tmp_path / "admission.sqlite"
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as db:
+        db.add_all(
+            models.Room(room_name=f"R{room_id}", capacity=4, executive=False)
+            for room_id in range(1, WORKERS + 1)
+        )
+        db.commit()
+    engine.dispose()
+    return path
+
+
+def count_bookings(path, room_id=None):
+    engine = create_engine(f"sqlite:///{path}")
+    stmt = select(func.count()).select_from(models.Booking)
+    if room_id is not None:
+        stmt = stmt.where(models.Booking.room_id == room_id)
+    with engine.connect() as conn:
+        count = conn.scalar(stmt)
+    engine.dispose()
+    return count
+
+
+# スレッドごとに別の接続・セッションで、一斉に create_booking を実行する
+def hammer(path, bookings):
+    engine = create_engine(
+        f"sqlite:///{path}",
+        connect_args={"timeout": 30, "check_same_thread": False},
+        poolclass=NullPool,
+    )
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    barrier = threading.Barrier(len(bookings))
+
+    def attempt(booking):
+        with SessionLocal() as db:
+            barrier.wait()
+            try:
+                crud.create_booking(db, booking)
+                return 200
+            except HTTPException as exc:
+                return exc.status_code
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(bookings)) as executor:
+            return list(executor.map(attempt, bookings))
+    finally:
+        engine.dispose()
+
+
+def test_concurrent_bookings_for_one_slot_have_exactly_one_winner(database_path):
+    statuses = hammer(database_path, [make_booking(1, i) for i in range(WORKERS)])
+    assert sorted(statuses) == [200] + [409] * (WORKERS - 1)
+    assert count_bookings(database_path, room_id=1) == 1
+
+
+def test_concurrent_bookings_for_different_rooms_all_succeed(database_path):
+    statuses = hammer(
+        database_path, [make_booking(room_id) for room_id in range(1, WORKERS + 1)]
+    )
+    assert statuses == [200] * WORKERS
+    assert count_bookings(database_path) == WORKERS
+
+
+def test_concurrent_async_bookings_for_one_slot_have_exactly_one_winner(
+    database_path,
+):
+    async def main():
+        engine = create_async_engine(
+            f"sqlite+aiosqlite:///{database_path}",
+            connect_args={"timeout": 30},
+            poolclass=NullPool,
+        )
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+        async def attempt(offset_minutes):
+            async with session_factory() as db:
+                try:
+                    await crud_async.create_booking(db, make_booking(1, offset_minutes))
+                    return 200
+                except HTTPException as exc:
+                    return exc.status_code
+
+        try:
+            return await asyncio.gather(*(attempt(i) for i in range(WORKERS)))
+        finally:
+            await engine.dispose()
+
+    statuses = asyncio.run(main())
+    assert sorted(statuses) == [200] + [409] * (WORKERS - 1)
+    assert count_bookings(database_path, room_id=1) == 1
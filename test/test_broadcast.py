@@ -0,0 +1,81 @@
+# test_broadcast.py
+from datetime import datetime
+
+import models
+from broadcast import (
+    SUBSCRIBER_QUEUE_SIZE,
+    BookingBroadcaster,
+    Subscription,
+    booking_snapshot,
+    format_sse,
+)
+
+
+def make_booking(booking_id, room_id, day):
+    return models.Booking(
+        booking_id=booking_id,
+        user_id=1,
+        room_id=room_id,
+        start_datetime=datetime(2024, 1, day, 10),
+        end_datetime=datetime(2024, 1, day, 11),
+        version=1,
+    )
+
+
+def drain(subscription):
+    events = []
+    while not subscription.queue.empty():
+        events.append(subscription.queue.get_nowait())
+    return events
+
+
+def test_broadcaster_filters_by_room_and_window():
+    broadcaster = BookingBroadcaster()
+    room_1 = broadcaster.subscribe(Subscription(room_id=1))
+    day_2 = broadcaster.subscribe(
+        Subscription(window_start=datetime(2024, 1, 2), window_end=datetime(2024, 1, 3))
+    )
+    broadcaster.publish("created", make_booking(1, room_id=1, day=1))
+    previous = booking_snapshot(make_booking(2, room_id=2, day=2))
+    broadcaster.publish("updated", make_booking(2, room_id=1, day=5), previous)
+
+    assert [(e["type"], e["booking"]["booking_id"]) for e in drain(room_1)] == [
+        ("created", 1),
+        ("updated", 2),
+    ]
+    # 更新前の内容が期間に当てはまる場合も通知する（期間外へ移動したことが分かる）
+    assert [e["id"] for e in drain(day_2)] == [2]
+
+
+def test_broadcaster_replays_after_last_event_id_and_drops_slow_subscriber(
+    monkeypatch,
+):
+    broadcaster = BookingBroadcaster()
+    for booking_id in (1, 2, 3):
+        broadcaster.publish("created", make_booking(booking_id, room_id=1, day=1))
+    replayed = broadcaster.subscribe(Subscription(), last_event_id=1)
+    events = replayed.replay
+    assert [e["id"] for e in events] == [2, 3]
+    assert drain(replayed) == []
+    assert format_sse(events[-1]).startswith("id: 3\nevent: created\ndata: ")
+
+    monkeypatch.setattr("broadcast.SUBSCRIBER_QUEUE_SIZE", 1)
+    slow = broadcaster.subscribe(Subscription())
+    broadcaster.publish("created", make_booking(4, room_id=1, day=1))
+    broadcaster.publish("created", make_booking(5, room_id=1, day=1))
+    assert drain(slow) == [None]
+    assert broadcaster.subscriber_count == 1
+
+
+def test_broadcaster_replays_more_events_than_the_queue_holds():
+    broadcaster = BookingBroadcaster()
+    count = SUBSCRIBER_QUEUE_SIZE + 50
+    for booking_id in range(1, count + 1):
+        broadcaster.publish("created", make_booking(booking_id, room_id=1, day=1))
+    subscription = broadcaster.subscribe(Subscription(), last_event_id=0)
+    assert [e["id"] for e in subscription.replay] == list(range(1, count + 1))
+    assert broadcaster.subscriber_count == 1
+
+    # 再送後のイベントはキューで受け取る
+    broadcaster.publish("created", make_booking(count + 1, room_id=1, day=1))
+    assert [e["id"] for e in drain(subscription)] == [count + 1]
@@ -0,0 +1,338 @@
+# test_crud.py
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+
+import crud
+import models
+import schemas
+from pagination import encode_cursor
+from room_cache import room_catalog
+
+
+def make_booking(room_id, start, end, user_id=1):
+    return schemas.BookingCreate(
+        user_id=user_id,
+        room_id=room_id,
+        main_user_employee_number="0001",
+        member_employee_numbers=[],
+        guest_names=[],
+        start_datetime=start,
+        end_datetime=end,
+    )
+
+
+@pytest.fixture
+def room(db):
+    db_room = models.Room(room_name="A", capacity=4, executive=False)
+    db.add(db_room)
+    db.commit()
+    return db_room
+
+
+def test_create_booking_rejects_overlap(db, room):
+    crud.create_booking(
+        db,
+        make_booking(room.room_id, datetime(2024, 1, 1, 10), datetime(2024, 1, 1, 11)),
+    )
+    with pytest.raises(HTTPException) as exc:
+        crud.create_booking(
+            db,
+            make_booking(
+                room.room_id, datetime(2024, 1, 1, 10, 30), datetime(2024, 1, 1, 12)
+            ),
+        )
+    assert exc.value.status_code == 409
+
+
+def test_create_booking_allows_adjacent_slot(db, room):
+    crud.create_booking(
+        db,
+        make_booking(room.room_id, datetime(2024, 1, 1, 10), datetime(2024, 1, 1, 11)),
+    )
+    booking = crud.create_booking(
+        db,
+        make_booking(room.room_id, datetime(2024, 1, 1, 11), datetime(2024, 1, 1, 12)),
+    )
+    assert booking.booking_id is not None
+
+
+def test_update_booking_ignores_itself(db, room):
+    booking = crud.create_booking(
+        db,
+        make_booking(room.room_id, datetime(2024, 1, 1, 10), datetime(2024, 1, 1, 11)),
+    )
+    updated = crud.update_booking(
+        db,
+        booking.booking_id,
+        schemas.BookingUpdate(
+            user_id=1,
+            room_id=room.room_id,
+            start_datetime=datetime(2024, 1, 1, 10, 30),
+            end_datetime=datetime(2024, 1, 1, 11, 30),
+        ),
+    )
+    assert updated.start_datetime == datetime(2024, 1, 1, 10, 30)
+
+
+def test_update_room_requires_current_version(db, room):
+    updated_room = schemas.RoomUpdate(room_name="B", capacity=6)
+    updated = crud.update_room(db, room.room_id, updated_room, expected_versions={1})
+    assert updated.version == 2
+
+    # 古い版数での更新は 412（内容は変わらない）
+    with pytest.raises(HTTPException) as exc:
+        crud.update_room(
+            db,
+            room.room_id,
+            schemas.RoomUpdate(room_name="C", capacity=8),
+            expected_versions={1},
+        )
+    assert exc.value.status_code == 412
+    assert exc.value.headers["ETag"] == '"2"'
+    db.expire_all()
+    assert db.get(models.Room, room.room_id).room_name == "B"
+
+
+def test_commit_versioned_rejects_concurrent_update(db, room):
+    booking = crud.create_booking(
+        db,
+        make_booking(room.room_id, datetime(2024, 1, 1, 10), datetime(2024, 1, 1, 11)),
+    )
+    # 別のセッションが版数 1 を読み込んだ後に、先に更新が commit された場合
+    other = Session(bind=db.get_bind())
+    stale = other.get(models.Booking, booking.booking_id)
+    crud.update_booking(
+        db,
+        booking.booking_id,
+        schemas.BookingUpdate(
+            user_id=1,
+            room_id=room.room_id,
+            start_datetime=datetime(2024, 1, 1, 12),
+            end_datetime=datetime(2024, 1, 1, 13),
+        ),
+        expected_versions={1},
+    )
+    stale.end_datetime = datetime(2024, 1, 1, 14)
+    with pytest.raises(HTTPException) as exc:
+        crud.commit_versioned(other)
+    assert exc.value.status_code == 412
+    other.close()
+    db.expire_all()
+    stored = db.get(models.Booking, booking.booking_id)
+    assert (stored.version, stored.end_datetime) == (2, datetime(2024, 1, 1, 13))
+
+
+def test_get_available_rooms_excludes_booked_room(db, room):
+    other = models.Room(room_name="B", capacity=10, executive=False)
+    db.add(other)
+    db.commit()
+    crud.create_booking(
+        db,
+        make_booking(room.room_id, datetime(2024, 1, 1, 10), datetime(2024, 1, 1, 11)),
+    )
+    rooms = crud.get_available_rooms(
+        db, datetime(2024, 1, 1, 10, 30), datetime(2024, 1, 1, 11, 30)
+    )
+    assert [r.room_id for r in rooms] == [other.room_id]
+
+
+def test_get_free_slots_sweeps_sorted_bookings(db, room):
+    for hour in (10, 13):
+        crud.create_booking(
+            db,
+            make_booking(
+                room.room_id, datetime(2024, 1, 1, hour), datetime(2024, 1, 1, hour + 1)
+            ),
+        )
+    slots = crud.get_free_slots(
+        db,
+        [room.room_id],
+        datetime(2024, 1, 1, 9),
+        timedelta(hours=1),
+        3,
+        datetime(2024, 1, 1, 18),
+    )
+    assert slots[room.room_id] == [
+        (datetime(2024, 1, 1, 9), datetime(2024, 1, 1, 10)),
+        (datetime(2024, 1, 1, 11), datetime(2024, 1, 1, 13)),
+        (datetime(2024, 1, 1, 14), datetime(2024, 1, 1, 18)),
+    ]
+
+
+def test_get_booking_keyset_pagination(db, room):
+    for hour in (9, 12, 10, 11):
+        crud.create_booking(
+            db,
+            make_booking(
+                room.room_id, datetime(2024, 1, 1, hour), datetime(2024, 1, 1, hour, 30)
+            ),
+        )
+    first_page = crud.get_booking(db, limit=2)
+    cursor = encode_cursor([first_page[-1].start_datetime, first_page[-1].booking_id])
+    second_page = crud.get_booking(db, limit=2, cursor=cursor)
+    assert [b.start_datetime.hour for b in first_page + second_page] == [9, 10, 11, 12]
+
+
+def test_get_booking_filters_and_descending_cursor(db, room):
+    executive = models.Room(room_name="B", capacity=4, executive=True)
+    db.add(executive)
+    db.commit()
+    for user_id, room_id, day in [
+        (1, room.room_id, 1),
+        (2, room.room_id, 2),
+        (1, executive.room_id, 3),
+        (1, room.room_id, 9),
+    ]:
+        db.add(
+            models.Booking(
+                user_id=user_id,
+                room_id=room_id,
+                start_datetime=datetime(2024, 1, day, 10),
+                end_datetime=datetime(2024, 1, day, 11),
+            )
+        )
+    db.commit()
+    this_week = dict(start_from=datetime(2024, 1, 1), start_to=datetime(2024, 1, 8))
+    mine = crud.get_booking(db, user_id=1, descending=True, limit=1, **this_week)
+    cursor = encode_cursor([mine[-1].start_datetime, mine[-1].booking_id])
+    mine += crud.get_booking(db, user_id=1, descending=True, cursor=cursor, **this_week)
+    assert [b.start_datetime.day for b in mine] == [3, 1]
+    assert [b.room_id for b in crud.get_booking(db, executive_only=True)] == [
+        executive.room_id
+    ]
+
+    # 「今週の自分の予約」は (user_id, start_datetime) のインデックスの範囲検索になる
+    statement = (
+        db.query(models.Booking)
+        .filter(*crud.booking_filters(user_id=1, **this_week))
+        .order_by(*crud.booking_order())
+        .statement.compile(compile_kwargs={"literal_binds": True})
+    )
+    plan = db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}").all()
+    assert any("ix_bookings_user_id_start" in row[-1] for row in plan)
+
+
+def test_expand_series_until_and_limit():
+    series = schemas.BookingSeriesCreate(
+        user_id=1,
+        room_id=1,
+        start_datetime=datetime(2024, 1, 1, 10),
+        end_datetime=datetime(2024, 1, 1, 11),
+        freq="DAILY",
+        interval=2,
+        until=datetime(2024, 1, 7, 10),
+    )
+    assert [start.day for start, _ in crud.expand_series(series)] == [1, 3, 5, 7]
+
+    series.until = datetime(2030, 1, 1)
+    with pytest.raises(HTTPException):
+        crud.expand_series(series)
+
+    # 1回も展開されない場合は 400
+    series.until = datetime(2023, 12, 31)
+    with pytest.raises(HTTPException) as exc:
+        crud.expand_series(series)
+    assert exc.value.status_code == 400
+
+
+@pytest.mark.parametrize(
+    "fields",
+    [{"until": datetime(2023, 12, 31), "count": None}, {"interval": 10**9}],
+)
+def test_booking_series_schema_rejects_invalid_range(fields):
+    values = dict(
+        user_id=1,
+        room_id=1,
+        start_datetime=datetime(2024, 1, 1, 10),
+        end_datetime=datetime(2024, 1, 1, 11),
+        freq="WEEKLY",
+        count=3,
+    )
+    with pytest.raises(ValidationError):
+        schemas.BookingSeriesCreate(**{**values, **fields})
+
+
+def test_room_catalog_serves_reads_and_refreshes_on_write(db, room):
+    assert [r.room_name for r in crud.get_rooms(db)] == ["A"]
+    loads = room_catalog.loads
+    assert crud.get_room_by_id(db, room.room_id).capacity == 4
+    assert room_catalog.loads == loads
+
+    crud.update_room(
+        db, room.room_id, schemas.RoomUpdate(room_name="A", capacity=8, executive=True)
+    )
+    cached = crud.get_room_by_id(db, room.room_id)
+    assert (cached.executive, cached.version) == (True, 2)
+    assert room_catalog.loads == loads + 1
+
+
+@pytest.mark.parametrize(
+    "fetch, values",
+    [
+        (crud.get_rooms, ["1"]),
+        (crud.get_users, [{"a": 1}]),
+        (crud.get_user_rows, [True]),
+        (crud.get_guest_users, [[1]]),
+        (crud.get_guest_user_rows, [1.5]),
+        (crud.get_booking, ["2024-01-01T10:00:00", {"a": 1}]),
+        (crud.get_booking, [1, 1]),
+    ],
+)
+def test_list_cursor_rejects_wrong_value_types(db, room, fetch, values):
+    with pytest.raises(HTTPException) as exc:
+        fetch(db, cursor=encode_cursor(values))
+    assert exc.value.status_code == 400
+
+
+def test_room_catalog_limits_reloads_for_missing_rooms(db, room, monkeypatch):
+    assert crud.get_room_by_id(db, room.room_id) is not None
+    loads = room_catalog.loads
+    for _ in range(5):
+        assert room_catalog.get(db, 99999) is None
+    assert room_catalog.loads == loads
+
+    # 他のワーカーで登録された会議室は、間隔を過ぎた後の参照で読み込まれる
+    db.add(models.Room(room_name="B", capacity=2, executive=False))
+    db.commit()
+    monkeypatch.setattr(room_catalog, "miss_reload_interval", 0)
+    assert room_catalog.get(db, room.room_id + 1).room_name == "B"
+    assert room_catalog.loads == loads + 1
+
+
+def test_delete_booking_after_concurrent_change(db, room):
+    booking = crud.create_booking(
+        db,
+        make_booking(room.room_id, datetime(2024, 1, 1, 10), datetime(2024, 1, 1, 11)),
+    )
+    booking_id = booking.booking_id
+    # 別のセッションが読み込んだ後に予約が更新された場合は 412
+    other = Session(bind=db.get_bind())
+    stale = other.get(models.Booking, booking_id)
+    crud.update_booking(
+        db,
+        booking_id,
+        schemas.BookingUpdate(
+            user_id=1,
+            room_id=room.room_id,
+            start_datetime=datetime(2024, 1, 1, 12),
+            end_datetime=datetime(2024, 1, 1, 13),
+        ),
+        expected_versions={1},
+    )
+    with pytest.raises(HTTPException) as exc:
+        crud.delete_booking(other, booking_id)
+    assert exc.value.status_code == 412
+    # 応答後のセッションは最新の版数を読み込み直している
+    assert stale.version == 2
+    other.close()
+
+    # 読み込んだ後に他で削除された場合は「見つからない」扱い
+    other = Session(bind=db.get_bind())
+    stale = other.get(models.Booking, booking_id)
+    assert crud.delete_booking(db, booking_id) is True
+    assert crud.delete_booking(other, booking_id) is False
+    other.close()
@@ -0,0 +1,439 @@
+# test_crud_async.py
+import asyncio
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+import crud_async
+import export
+import models
+import schemas
+import user_import
+from analytics import build_utilization_groups
+
+
+def run(coro_func):
+    # aiosqlite のインメモリDBに対して非同期の処理を実行する
+    async def main():
+        engine = create_async_engine("sqlite+aiosqlite://")
+        async with engine.begin() as conn:
+            await conn.run_sync(models.Base.metadata.create_all)
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        try:
+            async with session_factory() as db:
+                return await coro_func(db)
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(main())
+
+
+def make_booking(room_id, start, end):
+    return schemas.BookingCreate(
+        user_id=1,
+        room_id=room_id,
+        main_user_employee_number="0001",
+        member_employee_numbers=[],
+        guest_names=[],
+        start_datetime=start,
+        end_datetime=end,
+    )
+
+
+async def add_room(db):
+    room = models.Room(room_name="A", capacity=4, executive=False)
+    db.add(room)
+    await db.commit()
+    return room
+
+
+def test_async_create_booking_rejects_overlap():
+    async def scenario(db):
+        room = await add_room(db)
+        await crud_async.create_booking(
+            db,
+            make_booking(
+                room.room_id, datetime(2024, 1, 1, 10), datetime(2024, 1, 1, 11)
+            ),
+        )
+        with pytest.raises(HTTPException) as exc:
+            await crud_async.create_booking(
+                db,
+                make_booking(
+                    room.room_id, datetime(2024, 1, 1, 10, 30), datetime(2024, 1, 1, 12)
+                ),
+            )
+        return exc.value.status_code
+
+    assert run(scenario) == 409
+
+
+def test_async_lookups_and_delete():
+    async def scenario(db):
+        room = await add_room(db)
+        booking = await crud_async.create_booking(
+            db,
+            make_booking(
+                room.room_id, datetime(2024, 1, 1, 10), datetime(2024, 1, 1, 11)
+            ),
+        )
+        assert (await crud_async.get_room_by_id(db, room.room_id)).room_name == "A"
+        assert [b.booking_id for b in await crud_async.get_booking(db)] == [
+            booking.booking_id
+        ]
+        assert await crud_async.delete_booking(db, booking.booking_id)
+        return await crud_async.get_booking_by_id(db, booking.booking_id)
+
+    assert run(scenario) is None
+
+
+def test_async_create_booking_with_members_single_transaction():
+    async def scenario(db):
+        room = await add_room(db)
+        db.add_all(
+            [
+                models.User(username=f"u{n}", role="社員", employee_number=n)
+                for n in ("0001", "0002", "0003")
+            ]
+        )
+        await db.commit()
+        booking_data = make_booking(
+            room.room_id, datetime(2024, 1, 1, 10), datetime(2024, 1, 1, 11)
+        )
+        booking_data.member_employee_numbers = ["0002", "0003", "0002", "9999"]
+        booking_data.guest_names = ["guest1", "guest2"]
+        booking = await crud_async.create_booking_with_members(db, booking_data)
+
+        members = await db.execute(
+            select(models.BookingUsers.user_id).where(
+                models.BookingUsers.booking_id == booking.booking_id
+            )
+        )
+        guests = await db.execute(
+            select(models.GuestUser.name).where(
+                models.GuestUser.booking_id == booking.booking_id
+            )
+        )
+        return booking.main_user_id, sorted(members.scalars()), sorted(guests.scalars())
+
+    assert run(scenario) == (1, [2, 3], ["guest1", "guest2"])
+
+
+def test_async_get_users_by_employee_numbers():
+    async def scenario(db):
+        db.add_all(
+            [
+                models.User(username=f"u{n}", role="社員", employee_number=n)
+                for n in ("0001", "0002")
+            ]
+        )
+        await db.commit()
+        users = await crud_async.get_users_by_employee_numbers(db, ["0002", "9999"])
+        return [user.employee_number for user in users]
+
+    assert run(scenario) == ["0002"]
+
+
+def test_async_create_booking_series_reports_conflicts():
+    async def scenario(db):
+        room = await add_room(db)
+        # 3週目に既存の予約がある
+        await crud_async.create_booking(
+            db,
+            make_booking(
+                room.room_id, datetime(2024, 1, 15, 10, 30), datetime(2024, 1, 15, 11)
+            ),
+        )
+        series = schemas.BookingSeriesCreate(
+            user_id=1,
+            room_id=room.room_id,
+            start_datetime=datetime(2024, 1, 1, 10),
+            end_datetime=datetime(2024, 1, 1, 11),
+            freq="WEEKLY",
+            count=4,
+        )
+        db_series, bookings, conflicts = await crud_async.create_booking_series(
+            db, series
+        )
+        assert all(b.series_id == db_series.series_id for b in bookings)
+        return [b.start_datetime.day for b in bookings], conflicts
+
+    days, conflicts = run(scenario)
+    assert days == [1, 8, 22]
+    assert conflicts == [(datetime(2024, 1, 15, 10), datetime(2024, 1, 15, 11))]
+
+
+def test_async_get_utilization_rows_clips_to_window():
+    async def scenario(db):
+        room = await add_room(db)
+        db.add_all(
+            [
+                models.Booking(
+                    user_id=1,
+                    room_id=room.room_id,
+                    start_datetime=datetime(2023, 12, 31, 23),
+                    end_datetime=datetime(2024, 1, 1, 1),
+                ),
+                models.Booking(
+                    user_id=1,
+                    room_id=room.room_id,
+                    start_datetime=datetime(2024, 1, 1, 9),
+                    end_datetime=datetime(2024, 1, 1, 10, 30),
+                ),
+            ]
+        )
+        await db.commit()
+        rows = await crud_async.get_utilization_rows(
+            db, datetime(2024, 1, 1), datetime(2024, 1, 2), "hour"
+        )
+        return {row.hour: round(row.booked_seconds) for row in rows}
+
+    assert run(scenario) == {0: 3600, 9: 3600, 10: 1800}
+
+
+def test_async_get_utilization_rows_splits_bookings_across_buckets():
+    async def scenario(db):
+        room = await add_room(db)
+        db.add_all(
+            [
+                models.Booking(
+                    user_id=1,
+                    room_id=room.room_id,
+                    start_datetime=datetime(2024, 1, 1, 9),
+                    end_datetime=datetime(2024, 1, 1, 12),
+                ),
+                # UTC+9 で 1/1 23:00〜1/2 01:00 にあたる予約
+                models.Booking(
+                    user_id=1,
+                    room_id=room.room_id,
+                    start_datetime=datetime(2024, 1, 1, 14),
+                    end_datetime=datetime(2024, 1, 1, 16),
+                ),
+            ]
+        )
+        await db.commit()
+        window = (datetime(2023, 12, 31, 15), datetime(2024, 1, 2, 15))
+        hours = await crud_async.get_utilization_rows(db, *window, "hour", 540)
+        days = await crud_async.get_utilization_rows(db, *window, "day", 540)
+        room_hours = await crud_async.get_utilization_rows(
+            db, *window, "room_hour", 540
+        )
+        return room, hours, days, room_hours
+
+    room, hours, days, room_hours = run(scenario)
+    assert {row.hour: row.booked_seconds for row in hours} == {
+        18: 3600,
+        19: 3600,
+        20: 3600,
+        23: 3600,
+        0: 3600,
+    }
+    assert {str(row.day): row.booked_seconds for row in days} == {
+        "2024-01-01": 3 * 3600 + 3600,
+        "2024-01-02": 3600,
+    }
+    assert [(row.room_id, row.hour) for row in room_hours] == [
+        (room.room_id, hour) for hour in (0, 18, 19, 20, 23)
+    ]
+    # どの時間帯・日も予約可能な時間を超えない
+    groups = build_utilization_groups("hour", hours, [room], 2)
+    groups += build_utilization_groups("day", days, [room], 2)
+    assert all(group["utilization_percent"] <= 100 for group in groups)
+
+
+def test_async_get_utilization_rows_spreads_bookings_longer_than_a_day():
+    async def scenario(db):
+        room = await add_room(db)
+        db.add_all(
+            [
+                models.Booking(
+                    user_id=1,
+                    room_id=room.room_id,
+                    start_datetime=datetime(2024, 1, 1, 9),
+                    end_datetime=datetime(2024, 1, 3, 10),
+                ),
+                models.Booking(
+                    user_id=1,
+                    room_id=room.room_id,
+                    start_datetime=datetime(2024, 1, 4, 9, 15),
+                    end_datetime=datetime(2024, 1, 4, 9, 45),
+                ),
+            ]
+        )
+        await db.commit()
+        window = (datetime(2024, 1, 1), datetime(2024, 1, 5))
+        return room, {
+            group_by: await crud_async.get_utilization_rows(db, *window, group_by)
+            for group_by in ("room", "day", "hour", "room_hour")
+        }
+
+    room, rows = run(scenario)
+    assert [tuple(row) for row in rows["room"]] == [(room.room_id, 49.5 * 3600, 2)]
+    assert {str(row.day): row.booked_seconds for row in rows["day"]} == {
+        "2024-01-01": 15 * 3600,
+        "2024-01-02": 24 * 3600,
+        "2024-01-03": 10 * 3600,
+        "2024-01-04": 1800,
+    }
+    # 9 時は3日分と 9:15〜9:45 の予約、0〜8 時と 10〜23 時は2日分
+    hours = {row.hour: (row.booked_seconds, row.booking_count) for row in rows["hour"]}
+    assert hours[9] == (3 * 3600 + 1800, 4)
+    assert all(hours[hour] == (2 * 3600, 2) for hour in range(24) if hour != 9)
+    assert [
+        (row.room_id, row.hour, row.booked_seconds) for row in rows["room_hour"]
+    ] == [(room.room_id, row.hour, row.booked_seconds) for row in rows["hour"]]
+
+
+def test_async_get_booking_detail_and_include():
+    async def scenario(db):
+        room = await add_room(db)
+        db.add_all(
+            [
+                models.User(username=f"u{n}", role="社員", employee_number=n)
+                for n in ("0001", "0002")
+            ]
+        )
+        await db.commit()
+        booking_data = make_booking(
+            room.room_id, datetime(2024, 1, 1, 10), datetime(2024, 1, 1, 11)
+        )
+        booking_data.member_employee_numbers = ["0002"]
+        booking_data.guest_names = ["guest1"]
+        booking = await crud_async.create_booking_with_members(db, booking_data)
+        db.expunge_all()
+
+        detail = await crud_async.get_booking_detail(db, booking.booking_id)
+        db.expunge_all()
+        include = crud_async.parse_booking_include("participants")
+        page = await crud_async.get_booking(db, include=include)
+        return (
+            detail.room.room_name,
+            detail.main_user.employee_number,
+            [user.employee_number for user in detail.members],
+            [guest.name for guest in detail.guests],
+            include,
+            [user.employee_number for user in page[0].members],
+        )
+
+    assert run(scenario) == (
+        "A",
+        "0001",
+        ["0002"],
+        ["guest1"],
+        ("main_user", "members", "guests"),
+        ["0002"],
+    )
+    with pytest.raises(HTTPException) as exc:
+        crud_async.parse_booking_include("room,unknown")
+    assert exc.value.status_code == 400
+
+
+def test_async_stream_booking_rows_in_batches():
+    async def scenario(db):
+        room = await add_room(db)
+        db.add_all(
+            [
+                models.Booking(
+                    user_id=1,
+                    room_id=room.room_id,
+                    start_datetime=datetime(2024, 1, day, 10),
+                    end_datetime=datetime(2024, 1, day, 11),
+                )
+                for day in range(1, 6)
+            ]
+        )
+        await db.commit()
+        batches = crud_async.stream_booking_rows(
+            db, start_from=datetime(2024, 1, 2), batch_size=2
+        )
+        chunks = [chunk async for chunk in export.stream_export(batches, "csv")]
+        return [len(chunk.splitlines()) for chunk in chunks], chunks[1]
+
+    sizes, first_rows = run(scenario)
+    assert sizes == [1, 2, 2]
+    assert first_rows.startswith("2,1,,1,2024-01-02T10:00:00,2024-01-02T11:00:00,,1\n")
+
+
+def test_async_create_users_bulk_reports_duplicates(monkeypatch):
+    async def fake_hash(passwords):
+        return [f"hashed-{password}" for password in passwords]
+
+    monkeypatch.setattr(crud_async, "hash_passwords_parallel", fake_hash)
+    rows = user_import.parse_user_rows(
+        "username,role,employee_number,password\n"
+        "a,社員,0002,pass1\n"
+        "b,社員,0002,pass2\n"
+        "c,不明,0003,pass3\n"
+        "taken,社員,0004,pass4\n".encode(),
+        "text/csv",
+    )
+    users, errors = user_import.validate_user_rows(rows)
+
+    async def scenario(db):
+        db.add(models.User(username="taken", role="社員", employee_number="0001"))
+        await db.commit()
+        created, duplicate_errors = await crud_async.create_users_bulk(db, users)
+        user = await crud_async.get_user_by_employee_number(db, "0002")
+        return created, duplicate_errors, user.password_hash
+
+    created, duplicate_errors, password_hash = run(scenario)
+    assert created == {1: 2}
+    assert sorted({**errors, **duplicate_errors}) == [2, 3, 4]
+    assert duplicate_errors[2] == "Duplicate employee_number in request"
+    assert duplicate_errors[4] == "username already registered"
+    assert password_hash == "hashed-pass1"
+
+
+def test_import_report_ignores_non_string_employee_number():
+    rows = [
+        {"username": "a", "role": "社員", "employee_number": 123, "password": "pass1"},
+        {"username": "b", "role": "社員", "employee_number": "0005", "password": "pass2"},
+        "not an object",
+    ]
+    users, errors = user_import.validate_user_rows(rows)
+    assert [row_number for row_number, _ in users] == [2]
+
+    report = schemas.UserImportReport.model_validate(
+        user_import.import_report(rows, {2: 10}, errors)
+    )
+    assert (report.created, report.failed) == (1, 2)
+    first, second, third = report.results
+    assert (first.status, first.employee_number) == ("error", None)
+    assert "employee_number" in first.error
+    assert (second.status, second.user_id, second.employee_number) == (
+        "created",
+        10,
+        "0005",
+    )
+    assert (third.status, third.error) == ("error", "Expected an object")
+
+
+def test_async_get_booking_rows_matches_orm_page():
+    async def scenario(db):
+        room = await add_room(db)
+        db.add_all(
+            [
+                models.Booking(
+                    user_id=day % 2,
+                    room_id=room.room_id,
+                    start_datetime=datetime(2024, 1, day, 10),
+                    end_datetime=datetime(2024, 1, day, 11),
+                )
+                for day in range(1, 6)
+            ]
+        )
+        await db.commit()
+        filters = dict(user_id=1, descending=True, limit=2)
+        bookings = await crud_async.get_booking(db, **filters)
+        rows = await crud_async.get_booking_rows(db, **filters)
+        return [
+            schemas.Booking.model_validate(booking, from_attributes=True).model_dump()
+            for booking in bookings
+        ], rows
+
+    bookings, rows = run(scenario)
+    assert [row["start_datetime"].day for row in rows] == [5, 3]
+    assert [{key: row[key] for key in bookings[0]} for row in rows] == bookings
@@ -0,0 +1,30 @@
+# test_database.py
+from sqlalchemy import create_engine, text
+
+from database import MeteredQueuePool, pool_stats
+from settings import Settings, to_async_url
+
+
+def test_settings_read_environment(monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", "mysql+pymysql://u:p@db/app")
+    monkeypatch.setenv("DB_POOL_SIZE", "20")
+    monkeypatch.setenv("DB_ECHO", "true")
+    settings = Settings()
+    assert settings.async_database_url == "mysql+aiomysql://u:p@db/app"
+    assert settings.pool_size == 20
+    assert settings.echo is True
+    assert to_async_url("sqlite:///app.db") == "sqlite+aiosqlite:///app.db"
+
+
+def test_pool_stats_report_checked_out_connections(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}", poolclass=MeteredQueuePool, pool_size=2
+    )
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        stats = pool_stats(engine.pool)
+        assert stats["checked_out"] == 1
+    stats = pool_stats(engine.pool)
+    assert stats["checked_out"] == 0
+    assert stats["wait_count"] == 1
+    engine.dispose()
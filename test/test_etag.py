@@ -0,0 +1,39 @@
+# test_etag.py
+import pytest
+from fastapi import HTTPException
+
+from etag import DataVersions, etag_matches, if_match_versions
+
+
+def test_etag_changes_with_table_version_and_url():
+    versions = DataVersions(ttl=3600)
+    etag = versions.etag(("rooms",), "/rooms/")
+    assert versions.etag(("rooms",), "/rooms/") == etag
+    assert versions.etag(("rooms",), "/rooms/?limit=5") != etag
+
+    versions.bump("bookings")
+    assert versions.etag(("rooms",), "/rooms/") == etag
+    versions.bump("rooms")
+    assert versions.etag(("rooms",), "/rooms/") != etag
+
+
+def test_etag_matches_weak_comparison_and_lists():
+    etag = 'W/"abc-1"'
+    assert etag_matches('W/"abc-1"', etag)
+    assert etag_matches('"abc-1"', etag)
+    assert etag_matches('W/"old", W/"abc-1"', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('W/"abc-2"', etag)
+    assert not etag_matches(None, etag)
+
+
+def test_if_match_versions_uses_strong_comparison():
+    assert if_match_versions('"3"') == {3}
+    assert if_match_versions('"3", "4"') == {3, 4}
+    assert if_match_versions("*") is None
+    # 弱い ETag や一覧の ETag はどの版数にも一致しない
+    assert if_match_versions('W/"3"') == set()
+    assert if_match_versions('W/"abc-1-2-ff"') == set()
+    with pytest.raises(HTTPException) as exc:
+        if_match_versions(None)
+    assert exc.value.status_code == 428
@@ -0,0 +1,95 @@
+# test_idempotency.py
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+import models
+import schemas
+from idempotency import REPLAYED_HEADER, IdempotencyGuard, request_hash
+
+ENDPOINT = "POST /guest_users/"
+
+
+def run(coro_func):
+    # 複数のセッションから同じインメモリDBを使う
+    async def main():
+        engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with engine.begin() as conn:
+            await conn.run_sync(models.Base.metadata.create_all)
+        try:
+            return await coro_func(async_sessionmaker(engine, expire_on_commit=False))
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(main())
+
+
+def test_idempotency_guard_replays_saved_response():
+    payload = schemas.GuestUserCreate(name="guest")
+
+    async def scenario(factory):
+        async with IdempotencyGuard("k", ENDPOINT, payload, factory) as first:
+            assert first.replay is None
+            # 処理中の同じキーは 409
+            with pytest.raises(HTTPException) as exc:
+                async with IdempotencyGuard("k", ENDPOINT, payload, factory):
+                    pass
+            assert exc.value.status_code == 409
+            await first.save(schemas.GuestUser, {"name": "guest", "guest_user_id": 7})
+
+        async with IdempotencyGuard("k", ENDPOINT, payload, factory) as again:
+            replay = again.replay
+        with pytest.raises(HTTPException) as exc:
+            other = schemas.GuestUserCreate(name="other")
+            async with IdempotencyGuard("k", ENDPOINT, other, factory):
+                pass
+        return replay, exc.value.status_code
+
+    replay, mismatch_status = run(scenario)
+    assert replay.status_code == 200
+    assert replay.headers[REPLAYED_HEADER] == "true"
+    assert replay.body == b'{"name":"guest","guest_user_id":7,"booking_id":null}'
+    assert mismatch_status == 422
+
+
+def test_idempotency_guard_releases_key_on_failure():
+    payload = schemas.GuestUserCreate(name="guest")
+
+    async def scenario(factory):
+        with pytest.raises(HTTPException):
+            async with IdempotencyGuard("k", ENDPOINT, payload, factory):
+                raise HTTPException(status_code=409, detail="conflict")
+        async with IdempotencyGuard("k", ENDPOINT, payload, factory) as retry:
+            return retry.replay
+
+    assert run(scenario) is None
+
+
+def test_idempotency_guard_keeps_key_when_response_is_not_saved():
+    payload = schemas.GuestUserCreate(name="guest")
+
+    async def scenario(factory):
+        # 書き込みの後、応答の変換に失敗した場合
+        with pytest.raises(ValidationError):
+            async with IdempotencyGuard("k", ENDPOINT, payload, factory) as first:
+                await first.save(schemas.GuestUser, {"name": "guest"})
+        async with IdempotencyGuard("k", ENDPOINT, payload, factory) as retry:
+            return retry.replay
+
+    replay = run(scenario)
+    assert replay.status_code == 409
+    assert replay.headers[REPLAYED_HEADER] == "true"
+
+
+def test_request_hash_excludes_password():
+    user = schemas.UserCreate(
+        username="a", role="社員", employee_number="0001", password="secret"
+    )
+    other_password = user.model_copy(update={"password": "another"})
+    other_name = user.model_copy(update={"username": "b"})
+    assert request_hash(user) == request_hash(other_password)
+    assert request_hash(user) != request_hash(other_name)
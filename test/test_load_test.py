@@ -0,0 +1,55 @@
+# test_load_test.py
+import os
+import random
+import sys
+from collections import Counter
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+
+import load_test  # noqa: E402
+
+
+def test_percentile_uses_nearest_rank():
+    values = list(range(1, 101))
+    assert load_test.percentile(values, 0.50) == 50
+    assert load_test.percentile(values, 0.95) == 95
+    assert load_test.percentile(values, 0.99) == 99
+    assert load_test.percentile([7], 0.99) == 7
+    assert load_test.percentile([], 0.5) == 0.0
+
+
+def test_route_summary_and_baseline_comparison():
+    summary = load_test.route_summary(
+        [10.0, 20.0, 30.0, 40.0], Counter({"200": 3, "409": 1}), 0, elapsed=2.0
+    )
+    assert summary["requests"] == 4
+    assert summary["throughput_rps"] == 2.0
+    assert summary["latency_ms"]["p50"] == 20.0
+    assert summary["latency_ms"]["max"] == 40.0
+
+    faster = load_test.route_summary([5.0, 10.0], Counter({"200": 2}), 0, elapsed=0.5)
+    comparison = load_test.compare(
+        {"routes": {"GET /users/": faster, "GET /new": faster}},
+        {"routes": {"GET /users/": summary}},
+    )
+    assert list(comparison) == ["GET /users/"]
+    assert comparison["GET /users/"]["throughput_ratio"] == 2.0
+    assert comparison["GET /users/"]["p50_ms_delta"] == -15.0
+
+
+def test_seed_bookings_do_not_overlap_within_a_room():
+    dataset = load_test.Dataset(
+        users=10, rooms=3, bookings=300, days=7, start=datetime(2030, 1, 1)
+    )
+    rows = load_test.seed_bookings(dataset, random.Random(1))
+    assert 0 < len(rows) <= 300
+    for room_id in range(1, 4):
+        ranges = sorted(
+            (row["start_datetime"], row["end_datetime"])
+            for row in rows
+            if row["room_id"] == room_id
+        )
+        assert all(
+            end <= next_start for (_, end), (next_start, _) in zip(ranges, ranges[1:])
+        )
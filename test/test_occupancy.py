@@ -0,0 +1,30 @@
+# test_occupancy.py
+from collections import namedtuple
+from datetime import date, datetime
+
+from occupancy import build_occupancy_grid, day_range, decode_row, encode_rows
+
+Row = namedtuple("Row", "room_id start_datetime end_datetime")
+
+
+def test_build_occupancy_grid_marks_partial_slots_and_clips_to_day():
+    day_start, _, slot_count = day_range(date(2024, 1, 1), 60)
+    rows = [
+        Row(1, datetime(2024, 1, 1, 9, 30), datetime(2024, 1, 1, 11)),
+        Row(2, datetime(2023, 12, 31, 22), datetime(2024, 1, 1, 1)),
+        Row(2, datetime(2024, 1, 1, 23), datetime(2024, 1, 2, 2)),
+        Row(3, datetime(2024, 1, 1, 9), datetime(2024, 1, 1, 10)),
+    ]
+    grid = build_occupancy_grid([1, 2], rows, day_start, 60, slot_count)
+    assert grid.shape == (2, 24)
+    assert list(grid[0].nonzero()[0]) == [9, 10]
+    assert list(grid[1].nonzero()[0]) == [0, 23]
+
+
+def test_encode_rows_round_trip():
+    day_start, _, slot_count = day_range(date(2024, 1, 1), 15, utc_offset_minutes=540)
+    assert day_start == datetime(2023, 12, 31, 15)
+    rows = [Row(1, datetime(2023, 12, 31, 16), datetime(2023, 12, 31, 16, 45))]
+    grid = build_occupancy_grid([1], rows, day_start, 15, slot_count)
+    (encoded,) = encode_rows(grid)
+    assert (decode_row(encoded, slot_count) == grid[0]).all()